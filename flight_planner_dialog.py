@@ -29,13 +29,19 @@ from .ui.terrain_section import TerrainSectionHandler
 from .ui.direction_section import DirectionSectionHandler
 import os
 from .error_reporting import QgsPrint, QgsTraceback, QgsMessBox
-from .geoprocessing_utils import add_to_canvas, find_matching_field
+from .geoprocessing_utils import add_to_canvas, find_matching_field, geometry_parts
+from .planning.dtm import build_mosaic, open_dtm, set_memmap_directory
+from .ui.flight_design.altitudes_utils.flight_parameters import calculate_flight_parameters
+import numpy as np
 from osgeo import gdal
 from qgis.core import (
     QgsMapLayerProxyModel, 
     QgsFieldProxyModel, 
     QgsCoordinateReferenceSystem, 
+    QgsCoordinateTransform,
     QgsProject,
+    QgsProcessingUtils,
+    QgsRasterLayer,
     Qgis
 )
 from .ui.flight_design.one_altitude.run_design import run_design_one_altitude
@@ -43,7 +49,7 @@ from .ui.flight_design.separate_altitude.run_design import run_design_separate_a
 from .ui.flight_design.terrain_following.run_design import run_design_terrain_following
 from .ui.flight_design.separate_altitude.worker import WorkerSeparate
 from .ui.flight_design.terrain_following.worker import WorkerTerrain
-from qgis.PyQt.QtCore import QThread
+from qgis.PyQt.QtCore import QThread, Qt, pyqtSignal
 from qgis.PyQt import QtWidgets
 from .ui.quality_control.worker import WorkerControl
 
@@ -51,11 +57,14 @@ FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), 'flight_planner_dialog_base.ui'))
 
 class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
+    cancelDesign = pyqtSignal()
+
     def __init__(self, parent=None):
         if Qgis.QGIS_VERSION_INT < 33800:
             gdal.UseExceptions()
         super().__init__(parent)
         self.setupUi(self)
+        set_memmap_directory(QgsProcessingUtils.tempFolder())
         self.tabWidget.setCurrentIndex(0)
         """Hide Cancel button"""
         self.pushButtonCancelDesign.setVisible(False)
@@ -89,7 +98,9 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
         self.terrain_handler = TerrainSectionHandler(self)
         self.pushButtonGetHeights.clicked.connect(lambda _: self.terrain_handler.on_btn_get_heights_clicked())
 
-        self.direction_handler = DirectionSectionHandler(self.dial, self.spinBoxDirection)
+        self.direction_handler = DirectionSectionHandler(self.dial, self.spinBoxDirection,
+                                                         self.comboBoxDirectionCriterion)
+        self.pushButtonOptimizeDirection.clicked.connect(lambda _: self.optimize_direction())
         
         """Fill Altitude Type combobox"""
         self.comboBoxAltitudeType.addItems(["One Altitude ASL For Entire Flight",
@@ -118,6 +129,12 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
         self.mMapLayerComboBoxDTM.setFilters(QgsMapLayerProxyModel.RasterLayer)
         self.mMapLayerComboBoxAoI.setFilters(QgsMapLayerProxyModel.PolygonLayer)
         self.mMapLayerComboBoxCorridor.setFilters(QgsMapLayerProxyModel.LineLayer)
+
+        """DTM tiles menu"""
+        dtm_tiles_menu = QtWidgets.QMenu(self.toolButtonDTMTiles)
+        dtm_tiles_menu.addAction("Select Tile Files...", self.on_select_dtm_tile_files)
+        dtm_tiles_menu.addAction("Select Tiles Directory...", self.on_select_dtm_tiles_directory)
+        self.toolButtonDTMTiles.setMenu(dtm_tiles_menu)
         
         """Handle click of cancel buttons"""
         self.pushButtonCancelDesign.clicked.connect(lambda: self.cancel_worker('design'))
@@ -145,11 +162,36 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
         self.DTM = lyr
         if lyr:
             try:
-                self.raster = gdal.Open(lyr.source())
-                self.terrain_handler.set_dtm(lyr, self.raster)
+                self.dtm_store = open_dtm(lyr.source())
+                self.terrain_handler.set_dtm(lyr, self.dtm_store.dataset)
             except Exception:
                 QgsTraceback()
 
+    def on_select_dtm_tile_files(self):
+        """Build DTM mosaic from selected tile files"""
+        paths, _ = QtWidgets.QFileDialog.getOpenFileNames(
+            self, "Select DTM Tiles", "", "Rasters (*.tif *.tiff *.asc *.img *.vrt);;All files (*)")
+        self.load_dtm_tiles(paths)
+
+    def on_select_dtm_tiles_directory(self):
+        """Build DTM mosaic from tiles in selected directory"""
+        directory = QtWidgets.QFileDialog.getExistingDirectory(self, "Select DTM Tiles Directory")
+        self.load_dtm_tiles([directory] if directory else [])
+
+    def load_dtm_tiles(self, sources):
+        """Add VRT mosaic of DTM tiles to the project and select it as DTM.
+        Flight design and quality control read only tiles they need."""
+        if not sources:
+            return
+        try:
+            mosaic = build_mosaic(sources, QgsProcessingUtils.tempFolder())
+        except Exception as e:
+            QgsMessBox('DTM Tiles Error', f'Failed to build DTM mosaic: {str(e)}')
+            return
+        layer = QgsRasterLayer(mosaic, "DTM Mosaic")
+        QgsProject.instance().addMapLayer(layer)
+        self.mMapLayerComboBoxDTM.setLayer(layer)
+
     def on_mMapLayerComboBoxAoI_layerChanged(self):
         """Handle change of AoI layer"""
         lyr = self.mMapLayerComboBoxAoI.currentLayer()
@@ -221,6 +263,39 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
             QgsTraceback()
             self.pushButtonCancelDesign.setVisible(False)
     
+    def optimize_direction(self):
+        """Set flight direction with the fewest photos or strips over the AoI"""
+        self.AreaOfInterest = self.mMapLayerComboBoxAoI.currentLayer()
+        if not self.AreaOfInterest:
+            QgsMessBox('Missing Data', 'Please select an AoI layer.')
+            return
+        if getattr(self.camera_handler, 'camera', None) is None:
+            QgsMessBox('Missing Data', 'Please configure the camera.')
+            return
+        try:
+            target_crs = QgsCoordinateReferenceSystem(self.epsg_code)
+            transform = None
+            if self.AreaOfInterest.crs() != target_crs:
+                transform = QgsCoordinateTransform(self.AreaOfInterest.crs(), target_crs, QgsProject.instance())
+            rings = []
+            for f in self.AreaOfInterest.getFeatures():
+                geom = f.geometry()
+                if transform is not None:
+                    geom.transform(transform)
+                rings.extend(geometry_parts(geom))
+            vertices = np.vstack(rings)
+            Bx, By, _, len_across = calculate_flight_parameters(self)
+            self.progressBar.setValue(0)
+            ranked = self.direction_handler.optimize(
+                vertices, Bx, By, len_across,
+                self.spinBoxExceedExtremeStrips.value(), self.spinBoxMultipleBase.value())
+            table = "\n".join(f"{d:5.0f} [deg]: {p} photos, {s} strips"
+                              for d, p, s in ranked[:10])
+            criterion = self.comboBoxDirectionCriterion.currentText().lower()
+            QgsPrint(f"Flight directions with the {criterion}:\n{table}", level="Info")
+        except Exception:
+            QgsTraceback()
+
     def validate_crs(self, crs):
         if crs.isGeographic():
             QgsMessBox('Coordinate Reference System', 'Geographic Coordinate Systems are not supported.\n' \
@@ -260,6 +335,11 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
 
         worker.finished.connect(worker.deleteLater)
         thread.finished.connect(thread.deleteLater)
+        try:
+            self.cancelDesign.disconnect()
+        except TypeError:
+            pass
+        self.cancelDesign.connect(worker.cancel, Qt.DirectConnection)
         if mode == "terrain":
             thread.started.connect(worker.run_followingTerrain)
         else:
@@ -291,7 +371,7 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
     def cancel_worker(self, which):
         """Cancel Workers during processing"""
         if which == 'design' and hasattr(self, "worker") and self.worker:
-            self.worker.killed = True
+            self.cancelDesign.emit()
         elif which == 'control' and hasattr(self, "worker_control") and self.worker_control:
             self.worker_control.killed = True
             
@@ -380,7 +460,7 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
                 return
             
         try:
-            self.raster = gdal.Open(self.DTM.source())
+            self.dtm_store = open_dtm(self.DTM.source())
             threshold = self.doubleSpinBoxIterationThreshold.value()
             self.startWorker_control(
                 pointLayer=proj_centres,
@@ -392,7 +472,7 @@ class FlightPlannerDialog(QtWidgets.QDialog, FORM_CLASS):
                 crsVectorLayer=proj_centres.crs().authid(),
                 crsRasterLayer=self.DTM.crs().authid() or getattr(self, 'epsg_code', None),
                 DTM=self.DTM,
-                raster=self.raster,
+                dtmStore=self.dtm_store,
                 overlap=self.checkBoxOverlapImages.isChecked(),
                 gsd=self.checkBoxGSDmap.isChecked(),
                 footprint=self.checkBoxFootprint.isChecked(),
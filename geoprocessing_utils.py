@@ -8,9 +8,34 @@ from qgis.core import (
     QgsVectorLayer,
     Qgis
 )
-from qgis.analysis import QgsZonalStatistics
 from qgis.PyQt.QtCore import QMetaType, QVariant
+from math import isnan
 import re
+from .planning.geometry import wkb_parts, wkb_polygons
+
+
+class LayerWriter:
+    """Buffer features of a memory layer and add them in one batch."""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.features = []
+
+    def add(self, geometry, attributes):
+        """Queue feature with given geometry and attributes."""
+        feat = QgsFeature()
+        feat.setGeometry(geometry)
+        feat.setAttributes(attributes)
+        self.features.append(feat)
+
+    def flush(self):
+        """Add queued features to the layer and update its extent once."""
+        if self.features:
+            self.layer.dataProvider().addFeatures(self.features)
+            self.features = []
+        self.layer.updateExtents()
+        return self.layer
+
 
 def add_to_canvas(layers, group_name, counter=1):
     """Adding layer/layers to canvas"""
@@ -78,43 +103,27 @@ def create_waypoints_layer(crs_vect):
     
     return pr, waypoints_layer
 
-def create_waypoints(projection_centres, crs_vect):
+def create_waypoints(plan, crs_vect):
     """Create points where altitude or direction of flight change."""
 
-    pr, waypoints_layer = create_waypoints_layer(crs_vect)
-
-    strips_nr = int(projection_centres.maximumValue(0))
-    feats = projection_centres.getFeatures()
-    featList = [feat.attributes()[:6] + [feat.geometry()] for feat in feats]
-    featList.sort(key=lambda x: x[1])
-
-    waypoint_nr = 1
-    for strip_nr in range(1, strips_nr+1):
-        strip = [f for f in featList if int(f[0]) == strip_nr]
-        start_waypoint = strip[0]
-        end_waypoint = strip[-1]
-
-        x_start = start_waypoint[-1].asPoint().x()
-        y_start = start_waypoint[-1].asPoint().y()
-        x_end = end_waypoint[-1].asPoint().x()
-        y_end = end_waypoint[-1].asPoint().y()
-
-        feat_pnt = QgsFeature()
-        pnt_start = QgsPointXY(x_start, y_start)
-        feat_pnt.setGeometry(QgsGeometry.fromPointXY(pnt_start))
-        feat_pnt.setAttributes([waypoint_nr] + start_waypoint[2:6])
-        pr.addFeature(feat_pnt)
-        waypoint_nr += 1
-
-        feat_pnt = QgsFeature()
-        pnt_end = QgsPointXY(x_end, y_end)
-        feat_pnt.setGeometry(QgsGeometry.fromPointXY(pnt_end))
-        feat_pnt.setAttributes([waypoint_nr] + end_waypoint[2:6])
-        pr.addFeature(feat_pnt)
-        waypoint_nr += 1
-
-        waypoints_layer.updateExtents()
-    return waypoints_layer
+    _, waypoints_layer = create_waypoints_layer(crs_vect)
+    writer = LayerWriter(waypoints_layer)
+
+    for waypoint_nr, i in enumerate(plan.strip_ends(), 1):
+        x, y = plan.x[i], plan.y[i]
+        altitude_AGL = None if isnan(plan.agl[i]) else round(plan.agl[i], 2)
+        writer.add(QgsGeometry.fromPointXY(QgsPointXY(x, y)),
+                   [waypoint_nr, round(x, 2), round(y, 2), round(plan.z[i], 2), altitude_AGL])
+
+    return writer.flush()
+
+def geometry_parts(geom):
+    """Return polygon rings or lines of geometry as list of (N, 2) arrays."""
+    return wkb_parts(bytes(geom.asWkb()))
+
+def geometry_polygons(geom):
+    """Return polygons of geometry, each as list of its rings ((N, 2) arrays)."""
+    return wkb_polygons(bytes(geom.asWkb()))
 
 def find_matching_field(layer, patterns):
     """Find matching field name that contains given pattern"""
@@ -128,24 +137,3 @@ def find_matching_field(layer, patterns):
         if all(p in norm_name for p in norm_patterns):
             return field.name()
     return None
-
-def raster_minmax_in_vector(vector, raster):
-    """Return max and min value of raster clipped by vector layer."""
-
-    zone_stats = QgsZonalStatistics(vector, raster, 'pre-', 1,
-                                    QgsZonalStatistics.Statistics(
-                                        QgsZonalStatistics.Min |
-                                        QgsZonalStatistics.Max))
-    zone_stats.calculateStatistics(None)
-
-    for f in vector.getFeatures():
-        min_h = f.attribute('pre-min')
-        max_h = f.attribute('pre-max')
-
-    min_idx = vector.fields().lookupField('pre-min')
-    max_idx = vector.fields().lookupField('pre-max')
-    vector.startEditing()
-    vector.deleteAttributes([min_idx, max_idx])
-    vector.commitChanges()
-
-    return min_h, max_h
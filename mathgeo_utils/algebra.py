@@ -1,6 +1,5 @@
 import numpy as np
-from .coordinates import line 
-from qgis.core import Qgis
+from .coordinates import line
 
 from math import (
     cos,
@@ -29,10 +28,13 @@ def rotation_matrix(omega, phi, kappa):
     ])
     return R
 
-def bounding_box_at_angle(alpha, geom):
+def bounding_box_at_angle(alpha, vertices):
     """Calculate the two equations of the bounding box at the given
     angle and its dimensions Dx and Dy. The equations describe lines
-    that follow the sides of the bounding box."""
+    that follow the sides of the bounding box. Vertices are given
+    as (N, 2) array of x, y coordinates of the geometry."""
+    vertices = np.asarray(vertices, dtype=float)
+    vX, vY = vertices[:, 0], vertices[:, 1]
     if alpha != 90 and alpha != 270:
         a_ll = tan(alpha * pi / 180)
 
@@ -41,37 +43,23 @@ def bounding_box_at_angle(alpha, geom):
         else:
             a_l_ = -1 / 0.000000000000000001
 
-        x_centr = geom.centroid().asPoint().x()
-        y_centr = geom.centroid().asPoint().y()
-        b_ll = y_centr - a_ll * x_centr
-        b_l_ = y_centr - a_l_ * x_centr
-
         A_ll = a_ll
         B_ll = -1
-        C_ll = b_ll
         A_l_ = a_l_
         B_l_ = -1
-        C_l_ = b_l_
-
-        vrtx_dist_ll = []
-        vrtx_dist_l_ = []
 
-        for vertex in range(len(geom.convertToType(Qgis.GeometryType(1)).asPolyline())):
-            vX = geom.vertexAt(vertex).x()
-            vY = geom.vertexAt(vertex).y()
-            d_ll = (A_ll * vX + B_ll * vY + C_ll) / sqrt(A_ll ** 2 + B_ll ** 2)
-            vrtx_dist_ll.append(d_ll)
-            d_l_ = (A_l_ * vX + B_l_ * vY + C_l_) / sqrt(A_l_ ** 2 + B_l_ ** 2)
-            vrtx_dist_l_.append(d_l_)
+        # signed distances up to a constant shift, enough to find extremes
+        vrtx_dist_ll = A_ll * vX + B_ll * vY
+        vrtx_dist_l_ = A_l_ * vX + B_l_ * vY
 
-        i1_ll = vrtx_dist_ll.index(max(vrtx_dist_ll))
-        i2_ll = vrtx_dist_ll.index(min(vrtx_dist_ll))
-        i1_l_ = vrtx_dist_l_.index(max(vrtx_dist_l_))
-        i2_l_ = vrtx_dist_l_.index(min(vrtx_dist_l_))
-        b1_ll = geom.vertexAt(i1_ll).y() - a_ll * geom.vertexAt(i1_ll).x()
-        b2_ll = geom.vertexAt(i2_ll).y() - a_ll * geom.vertexAt(i2_ll).x()
-        b1_l_ = geom.vertexAt(i1_l_).y() - a_l_ * geom.vertexAt(i1_l_).x()
-        b2_l_ = geom.vertexAt(i2_l_).y() - a_l_ * geom.vertexAt(i2_l_).x()
+        i1_ll = np.argmax(vrtx_dist_ll)
+        i2_ll = np.argmin(vrtx_dist_ll)
+        i1_l_ = np.argmax(vrtx_dist_l_)
+        i2_l_ = np.argmin(vrtx_dist_l_)
+        b1_ll = vY[i1_ll] - a_ll * vX[i1_ll]
+        b2_ll = vY[i2_ll] - a_ll * vX[i2_ll]
+        b1_l_ = vY[i1_l_] - a_l_ * vX[i1_l_]
+        b2_l_ = vY[i2_l_] - a_l_ * vX[i2_l_]
         Dy = fabs(b1_ll - b2_ll) / sqrt(A_ll ** 2 + B_ll ** 2)
         Dx = fabs(b1_l_ - b2_l_) / sqrt(A_l_ ** 2 + B_l_ ** 2)
 
@@ -84,10 +72,10 @@ def bounding_box_at_angle(alpha, geom):
         else:
             b_l_ = max(b1_l_, b2_l_)
     else:
-        x_max = geom.boundingBox().xMaximum()
-        x_min = geom.boundingBox().xMinimum()
-        y_max = geom.boundingBox().yMaximum()
-        y_min = geom.boundingBox().yMinimum()
+        x_max = vX.max()
+        x_min = vX.min()
+        y_max = vY.max()
+        y_min = vY.min()
 
         Dx = y_max - y_min
         Dy = x_max - x_min
@@ -97,4 +85,15 @@ def bounding_box_at_angle(alpha, geom):
         else:
             a_ll, b_ll = line(y_max, y_min, x_min, x_min)
             a_l_, b_l_ = line(y_min, y_min, x_min, x_max)
-    return a_ll, b_ll, a_l_, b_l_, Dx, Dy
\ No newline at end of file
+    return a_ll, b_ll, a_l_, b_l_, float(Dx), float(Dy)
+
+def extents_at_angles(alphas, vertices):
+    """Return dimensions Dx and Dy of the bounding boxes of vertices
+    ((N, 2) array) at every given angle, as in bounding_box_at_angle."""
+    alphas = np.radians(np.asarray(alphas, dtype=float))
+    vertices = np.asarray(vertices, dtype=float)
+    along = vertices @ np.vstack((np.cos(alphas), np.sin(alphas)))
+    across = vertices @ np.vstack((-np.sin(alphas), np.cos(alphas)))
+    Dx = along.max(axis=0) - along.min(axis=0)
+    Dy = across.max(axis=0) - across.min(axis=0)
+    return Dx, Dy
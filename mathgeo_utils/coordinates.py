@@ -1,3 +1,4 @@
+import threading
 from math import (
     acos,
     cos,
@@ -5,6 +6,9 @@ from math import (
     sin,
     sqrt,
 )
+import numpy as np
+
+_transformers = threading.local()
 
 def crs2pixel(geo, x, y):
     """Transform coordinates from CRS to pixel coordinates."""
@@ -60,4 +64,32 @@ def line(ya, yb, xa, xb):
 def transf_coord(transformer, x, y):
     """Transform coordinates between two CRS."""
     x_transformed, y_transformed = transformer.transform(x, y)
-    return x_transformed, y_transformed
\ No newline at end of file
+    return x_transformed, y_transformed
+
+
+def crs_id(crs):
+    """Return CRS given as string or QgsCoordinateReferenceSystem
+    as string accepted by pyproj (authority id or WKT)."""
+    if crs is None or isinstance(crs, str):
+        return crs
+    return crs.authid() or crs.toWkt()
+
+
+def transformer(crs_from, crs_to):
+    """Return pyproj transformer (x, y order) between two CRS. Transformers
+    are not thread-safe, so one is created for every pair of CRS
+    in every thread and reused by later calls."""
+    from pyproj import Transformer
+    key = (crs_id(crs_from), crs_id(crs_to))
+    cache = _transformers.__dict__.setdefault('cache', {})
+    if key not in cache:
+        cache[key] = Transformer.from_crs(key[0], key[1], always_xy=True)
+    return cache[key]
+
+
+def transform_xy(crs_from, crs_to, x, y):
+    """Transform arrays of coordinates between two CRS in one call."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if crs_id(crs_from) == crs_id(crs_to):
+        return x, y
+    return transformer(crs_from, crs_to).transform(x, y)
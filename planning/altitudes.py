@@ -0,0 +1,36 @@
+import numpy as np
+
+
+def mean_altitude(h_min, h_max, altitude_AGL):
+    """Return altitude ASL of entire flight over terrain of given heights."""
+    return (h_max + h_min) / 2 + altitude_AGL
+
+
+def strip_altitude(h_min, h_max, altitude_AGL):
+    """Return altitude ASL of one strip over terrain of given heights."""
+    return altitude_AGL + h_max - (h_max - h_min) / 3
+
+
+def strip_outline(plan, rows):
+    """Return vertices (N, 2 array) of polygon covered by the strip
+    given by rows of its photos ordered by photo number."""
+    first, last = rows[0], rows[-1]
+    x_pnt = np.r_[plan.corners_x[first], plan.corners_x[last]]
+    y_pnt = np.r_[plan.corners_y[first], plan.corners_y[last]]
+
+    if float(plan.kappa[last]) in [-90, 0, 90, 180]:
+        x_min, x_max = x_pnt.min(), x_pnt.max()
+        y_min, y_max = y_pnt.min(), y_pnt.max()
+        return np.array([[x_min, y_min], [x_max, y_min], [x_max, y_max],
+                         [x_min, y_max], [x_min, y_min]])
+
+    pnts = np.column_stack((x_pnt, y_pnt))
+    outline = pnts[[np.argmin(pnts[:, 0]), np.argmin(pnts[:, 1]),
+                    np.argmax(pnts[:, 0]), np.argmax(pnts[:, 1])]]
+    return np.vstack((outline, outline[:1]))
+
+
+def terrain_agl(plan, terrain_z, rows=None):
+    """Set altitude AGL of projection centres from terrain heights under them."""
+    rows = np.arange(len(plan)) if rows is None else rows
+    plan.agl[rows] = plan.z[rows] - np.asarray(terrain_z, dtype=float)
@@ -0,0 +1,178 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from math import (
+    atan2,
+    ceil,
+    cos,
+    fabs,
+    pi,
+    radians,
+    sin,
+    sqrt,
+)
+from ..mathgeo_utils.algebra import bounding_box_at_angle
+from ..mathgeo_utils.coordinates import lines_intersection
+from .cache import fingerprint, plan_cache
+from .geometry import band_intervals, distance_to_intervals
+from .parameters import block_direction
+from .result import PlanResult
+
+
+def calculate_offsets(alpha, a_ll, b_ll, a_l_, b_l_, Dx, Dy, Bx, By, Ly, m, x):
+    Nx, Ny = strips_projection_centres_number(Dx, Dy, Bx, By, Ly, m, x)
+    Dy_o = max(Dy - 2 * (0.5 - x / 100) * Ly, 0)
+    By_o = Dy_o / (Ny - 1) if Ny != 1 else 0
+
+    A, B = a_ll, -1
+    C1 = b_ll
+    sign = 1 if alpha > 90 and alpha <= 270 else -1
+    if Ny == 1:
+        C2 = C1 + sign * Dy / 2 * sqrt(A**2 + B**2)
+    else:
+        C2 = C1 + sign * (0.5 - x / 100) * Ly * sqrt(A**2 + B**2)
+
+    a1, b1 = a_ll, C2
+
+    D = ((ceil(Dx / Bx)) * Bx - Dx) / 2
+    A2, B2 = a_l_, -1
+    C12 = b_l_
+    sign2 = -1 if 0 <= alpha <= 180 else 1
+    C22 = C12 + sign2 * D * sqrt(A2**2 + B2**2)
+    a2, b2 = a_l_, C22
+
+    x0, y0 = lines_intersection(a1, b1, a2, b2)
+    dx = cos(radians(alpha)) * Bx
+    dy = sin(radians(alpha)) * Bx
+    dx0 = cos(radians(alpha) - pi / 2) * By_o
+    dy0 = sin(radians(alpha) - pi / 2) * By_o
+
+    return Nx, Ny, x0, y0, dx, dy, dx0, dy0
+
+
+def strips_projection_centres_number(Dx, Dy, Bx, By, Ly, m, x):
+    """Return number of strips Ny and projection centres Nx
+    for Area of Interst or one segment of corridor flight."""
+
+    Dy_o = Dy - 2 * (0.5 - x / 100) * Ly
+
+    if Dy_o < 0:
+        Dy_o = 0
+    Ny = ceil(round(Dy_o / By, 9)) + 1
+
+    Nx = ceil(Dx / Bx) + 2 * m + 1
+
+    return Nx, Ny
+
+
+def candidate_centres(Nx, Ny, x0, y0, dx, dy, dx0, dy0, m):
+    """Return base indexes and x, y coordinates (Ny, Nx arrays)
+    of all candidate projection centres of the block."""
+    n = np.arange(-m, Nx - m)
+    k = np.arange(Ny).reshape(-1, 1)
+    xc = x0 + k * dx0 + n * dx
+    yc = y0 + k * dy0 + n * dy
+    return n, xc, yc
+
+
+def footprint_corners(xc, yc, alpha, theta, d):
+    """Return x, y coordinates of the four footprint corners
+    of every given projection centre (last axis holds the corners)."""
+    angles = radians(alpha) + np.array([theta - pi, pi - theta, theta, -theta])
+    corners_x = np.asarray(xc)[..., np.newaxis] + np.cos(angles) * d
+    corners_y = np.asarray(yc)[..., np.newaxis] + np.sin(angles) * d
+    return corners_x, corners_y
+
+
+def keep_candidates(n, Bx, m, intervals):
+    """Return mask of candidates whose central line lies within
+    m bases from the strip clipped to the range geometry. Every clipped
+    part lies inside the strip band, so the distance between the central
+    line and the part is the along-track gap to its interval."""
+    return distance_to_intervals(n * Bx, intervals) <= m * Bx
+
+
+def serpentine_numbering(k, n, strip_nr, photo_nr):
+    """Return strip and photo numbers of kept projection centres given
+    in generation order (block strip k, base index n). Every block strip
+    and every gap between bases starts a new strip and every odd block
+    strip is numbered backwards, so the photos follow a zig-zag flight."""
+    if n.size == 0:
+        return n.astype(int), n.astype(int)
+
+    first = np.r_[True, k[1:] != k[:-1]]
+    strips = strip_nr + np.cumsum(first | (np.r_[0, np.diff(n)] != 1))
+    photos = photo_nr + 1 + np.arange(n.size)
+
+    starts = np.flatnonzero(first)
+    group = np.cumsum(first) - 1
+    s_sum = np.minimum.reduceat(strips, starts) + np.maximum.reduceat(strips, starts)
+    p_sum = np.minimum.reduceat(photos, starts) + np.maximum.reduceat(photos, starts)
+    backward = k % 2 != 0
+    strips = np.where(backward, s_sum[group] - strips, strips)
+    photos = np.where(backward, p_sum[group] - photos, photos)
+    return strips, photos
+
+
+def projection_centres(alpha, rings, a_ll, b_ll, a_l_, b_l_,
+                       Dx, Dy, Bx, By, Lx, Ly, x, m, H, strip_nr=0, photo_nr=0):
+    """Return plan result with projection centres and photo footprints
+    covering the range given by its rings (list of N, 2 arrays)."""
+    Nx, Ny, x0, y0, dx, dy, dx0, dy0 = calculate_offsets(
+        alpha, a_ll, b_ll, a_l_, b_l_, Dx, Dy, Bx, By, Ly, m, x
+    )
+    d = sqrt((Lx / 2)**2 + (Ly / 2)**2)
+    theta = fabs(atan2(Ly / 2, Lx / 2))
+
+    n, xc, yc = candidate_centres(Nx, Ny, x0, y0, dx, dy, dx0, dy0, m)
+    corners_x, corners_y = footprint_corners(xc, yc, alpha, theta, d)
+    t_start = -m * Bx - Lx / 2
+    t_end = (Nx - m - 1) * Bx + Lx / 2
+
+    kept_k, kept_i = [], []
+    for k in range(Ny):
+        intervals = band_intervals(rings, x0 + k * dx0, y0 + k * dy0,
+                                   alpha, Ly / 2, t_start, t_end)
+        kept = np.flatnonzero(keep_candidates(n, Bx, m, intervals))
+        kept_k.append(np.full(kept.size, k))
+        kept_i.append(kept)
+
+    kept_k = np.concatenate(kept_k)
+    kept_i = np.concatenate(kept_i)
+    strips, photos = serpentine_numbering(kept_k, n[kept_i], strip_nr, photo_nr)
+    kappas = np.where(kept_k % 2 != 0, (alpha + 180) % 360, alpha)
+
+    return PlanResult(strips, photos, xc[kept_k, kept_i], yc[kept_k, kept_i],
+                      np.full(kept_k.size, H, dtype=float), kappas,
+                      corners_x[kept_k, kept_i], corners_y[kept_k, kept_i])
+
+
+def bounding_boxes(alphas, vertices_list):
+    """Return bounding_box_at_angle of every vertices ((N, 2) array) at its
+    angle, cached by fingerprint of all of them, so that runs over the same
+    ranges with other parameters reuse the vertex distances."""
+    key = fingerprint('bounding_boxes', list(alphas), list(vertices_list))
+    return plan_cache.get_or_compute(key, lambda: [
+        bounding_box_at_angle(alpha, vertices) for alpha, vertices in zip(alphas, vertices_list)])
+
+
+def plan_block(rings, direction, Bx, By, Lx, Ly, x, m, H):
+    """Return plan result of block flight over the range given
+    by its rings for flight direction [deg] measured from north."""
+    alpha = block_direction(direction)
+    (a, b, a2, b2, Dx, Dy), = bounding_boxes([alpha], [np.vstack(rings)])
+    return projection_centres(alpha, rings, a, b, a2, b2, Dx, Dy,
+                              Bx, By, Lx, Ly, x, m, H)
+
+
+def plan_blocks(polygons, direction, Bx, By, Lx, Ly, x, m, H, max_workers=None):
+    """Return plan result of block flights over every polygon (list of
+    its rings) as one mission. Polygons are planned concurrently and
+    numbered one after another in the given order."""
+    if not polygons:
+        raise ValueError("Area of Interest has no polygons.")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        plans = list(executor.map(
+            lambda rings: plan_block(rings, direction, Bx, By, Lx, Ly, x, m, H),
+            polygons
+        ))
+    return PlanResult.chain(plans)
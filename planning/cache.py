@@ -0,0 +1,130 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from .result import PlanResult
+
+
+def fingerprint(*parts):
+    """Return hex digest identifying the given inputs (numbers, strings,
+    NumPy arrays and nested lists, tuples or dicts of them)."""
+    digest = hashlib.sha1()
+    update_digest(digest, parts)
+    return digest.hexdigest()
+
+
+def update_digest(digest, value):
+    if isinstance(value, np.ndarray):
+        digest.update(f"ndarray{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}{len(value)}".encode())
+        for v in value:
+            update_digest(digest, v)
+    elif isinstance(value, dict):
+        update_digest(digest, sorted(value.items()))
+    elif isinstance(value, (bytes, bytearray)):
+        digest.update(bytes(value))
+    else:
+        digest.update(repr(value).encode())
+
+
+def source_fingerprint(path):
+    """Return path of data source with time and size of its file
+    modification, so the fingerprint changes when the file is rewritten."""
+    try:
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+    except (OSError, TypeError, ValueError):
+        return path
+
+
+def nbytes(value):
+    """Return approximate size [B] of cached value."""
+    if isinstance(value, PlanResult):
+        return sum(a.nbytes for a in vars(value).values())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    return sys.getsizeof(value)
+
+
+def copied(value):
+    """Return copy of cached value, so callers can modify it freely."""
+    if isinstance(value, PlanResult):
+        return value.copy()
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, tuple):
+        return tuple(copied(v) for v in value)
+    if isinstance(value, list):
+        return [copied(v) for v in value]
+    if isinstance(value, dict):
+        return {k: copied(v) for k, v in value.items()}
+    return value
+
+
+class PlanCache():
+    """Thread-safe LRU cache of intermediate planning results keyed
+    by fingerprints of their inputs, limited by number of entries
+    and by total size. Values are copied in and out unless copies
+    is False, e.g. for read-only arrays."""
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024, copies=True) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.copies = copies
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """Return copy of cached value or default if key is not cached."""
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            value, _ = self.entries[key]
+        return copied(value) if self.copies else value
+
+    def put(self, key, value):
+        """Cache copy of value, evicting least recently used entries."""
+        size = nbytes(value)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (copied(value) if self.copies else value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def get_or_compute(self, key, compute):
+        """Return cached value of key or compute and cache it."""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+plan_cache = PlanCache()
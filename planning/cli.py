@@ -0,0 +1,228 @@
+"""Batch flight planning without QGIS.
+
+Plans a block flight over every polygon feature of the AoI file in
+parallel and writes one GeoPackage per feature, e.g.:
+
+    python -m flight_planner.planning.cli aoi.gpkg dtm.tif \\
+        --camera "DMC III" --mode terrain --gsd 5 --output-dir plans
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from osgeo import ogr, osr
+
+from ..camera.models import Camera
+from ..mathgeo_utils.coordinates import transformer
+from .altitudes import mean_altitude, strip_altitude, strip_outline, terrain_agl
+from .block import plan_blocks
+from .datasets import read_polygons, rings_polygon, write_plan
+from .dtm import build_mosaic, is_mosaic, mosaic_window, open_dtm
+from .direction import CRITERIA, best_direction, direction_costs
+from .geometry import wkb_parts, wkb_polygons
+from .parameters import altitude_from_gsd, flight_parameters, gsd_from_altitude
+from .terrain import follow_terrain_strips
+
+CAMERAS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'camera', 'cameras.json')
+MODES = ('one', 'separate', 'terrain')
+
+
+def load_camera(name, path=CAMERAS_PATH):
+    """Return camera of given name from cameras file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for c in json.load(f):
+            if c['name'] == name:
+                return Camera(**c)
+    raise ValueError(f"Camera '{name}' not found in {path}.")
+
+
+def to_raster(transf_vct_rst, x, y):
+    if transf_vct_rst is None:
+        return x, y
+    return transf_vct_rst.transform(x, y)
+
+
+def raster_window(polygons, margin, transf_vct_rst):
+    """Return bounds of polygons enlarged by margin in raster CRS."""
+    vertices = np.vstack([ring for rings in polygons for ring in rings])
+    x_min, y_min = vertices.min(axis=0) - margin
+    x_max, y_max = vertices.max(axis=0) + margin
+    x, y = to_raster(transf_vct_rst, np.array([x_min, x_min, x_max, x_max]),
+                     np.array([y_min, y_max, y_min, y_max]))
+    return np.min(x), np.min(y), np.max(x), np.max(y)
+
+
+def strip_ends_waypoints(plan):
+    """Return waypoints (x, y, altitude ASL, altitude AGL rows)
+    at the first and the last projection centre of every strip."""
+    ends = plan.strip_ends()
+    return np.column_stack((plan.x[ends], plan.y[ends], plan.z[ends], plan.agl[ends]))
+
+
+def separate_altitudes(plan, aoi, dtm, altitude_AGL, transf_vct_rst):
+    """Set altitude ASL of every strip from terrain under the strip clipped to the AoI."""
+    for _, rows in plan.strip_groups():
+        g_strip = rings_polygon([strip_outline(plan, rows)])
+        common = g_strip.Intersection(aoi)
+        if common is None or common.IsEmpty():
+            common = g_strip
+        h_min, h_max = dtm.minmax_in_rings(wkb_parts(bytes(common.ExportToWkb())), transf_vct_rst)
+        plan.z[rows] = strip_altitude(h_min, h_max, altitude_AGL)
+
+
+def follow_terrain_altitudes(plan, dtm, altitude_AGL, tolerance, crs_vct, crs_rst, envelope_width=None):
+    """Set altitudes of projection centres following the terrain
+    and return waypoints of the flight."""
+    waypoints = []
+    for rows, waypoints_coords, pc_ASL, pc_z in follow_terrain_strips(
+            plan, dtm, altitude_AGL, tolerance, crs_vct, crs_rst, max_workers=1,
+            envelope_width=envelope_width):
+        on_profile = ~np.isnan(pc_ASL)
+        plan.z[rows[on_profile]] = pc_ASL[on_profile]
+        plan.agl[rows[on_profile]] = pc_ASL[on_profile] - pc_z[on_profile]
+        waypoints.append(np.column_stack((waypoints_coords, np.full(len(waypoints_coords), altitude_AGL))))
+    return np.vstack(waypoints) if waypoints else np.empty((0, 4))
+
+
+def run_job(job):
+    """Plan flight over one AoI feature and write it to GeoPackage."""
+    aoi = ogr.CreateGeometryFromWkb(job['aoi'])
+    polygons = wkb_polygons(job['aoi'])
+    dtm = open_dtm(job['dtm'], job['memmap_dir'])
+    camera = Camera(**job['camera'])
+
+    transf_vct_rst = None
+    if job['crs'] and dtm.crs_wkt and job['crs'] != dtm.crs_wkt:
+        transf_vct_rst = transformer(job['crs'], dtm.crs_wkt)
+
+    if job['altitude_agl'] is not None:
+        altitude_AGL = job['altitude_agl']
+        gsd = gsd_from_altitude(camera, altitude_AGL)
+    else:
+        gsd = job['gsd'] / 100
+        altitude_AGL = altitude_from_gsd(camera, gsd)
+    Bx, By, len_along, len_across = flight_parameters(camera, gsd, job['overlap'] / 100, job['sidelap'] / 100)
+
+    if is_mosaic(dtm.path):
+        margin = (job['multiple_base'] + 1) * len_along + len_across
+        dtm = open_dtm(mosaic_window(dtm.path, raster_window(polygons, margin, transf_vct_rst)),
+                       job['memmap_dir'])
+
+    h_min, h_max = job['min_height'], job['max_height']
+    if h_min is None or h_max is None:
+        dtm_min, dtm_max = dtm.minmax_in_rings(wkb_parts(job['aoi']), transf_vct_rst)
+        h_min = dtm_min if h_min is None else h_min
+        h_max = dtm_max if h_max is None else h_max
+
+    direction = job['direction']
+    if job['optimize_direction']:
+        vertices = np.vstack([ring for rings in polygons for ring in rings])
+        direction, _ = best_direction(direction_costs(
+            vertices, Bx, By, len_across, job['exceed'], job['multiple_base'],
+            max_workers=1), job['optimize_direction'])
+    plan = plan_blocks(polygons, direction, Bx, By, len_along, len_across,
+                       job['exceed'], job['multiple_base'], mean_altitude(h_min, h_max, altitude_AGL),
+                       max_workers=1)
+
+    if job['mode'] == 'terrain':
+        waypoints = follow_terrain_altitudes(plan, dtm, altitude_AGL, job['tolerance'],
+                                             job['crs'] or None, dtm.crs_wkt or None,
+                                             len_across if job['envelope'] else None)
+    else:
+        if job['mode'] == 'separate':
+            separate_altitudes(plan, aoi, dtm, altitude_AGL, transf_vct_rst)
+        terrain_agl(plan, dtm.sample(*to_raster(transf_vct_rst, plan.x, plan.y)))
+        waypoints = strip_ends_waypoints(plan)
+
+    write_plan(job['output'], plan, waypoints, job['crs'])
+    return job['output'], len(plan), direction
+
+
+def make_jobs(args):
+    """Return one job for every polygon feature of the AoI file."""
+    crs_wkt, polygons = read_polygons(args.aoi, args.epsg)
+    if crs_wkt and osr.SpatialReference(crs_wkt).IsGeographic():
+        raise ValueError(f"AoI CRS of {args.aoi} is geographic, plans need projected "
+                         "coordinates in metres - give projected CRS with --epsg.")
+    camera = load_camera(args.camera).__dict__
+    name = os.path.splitext(os.path.basename(args.aoi))[0]
+    dtm = args.dtm[0]
+    if len(args.dtm) > 1 or os.path.isdir(dtm):
+        dtm = build_mosaic(args.dtm, args.output_dir)
+    jobs = []
+    for fid, wkb in polygons:
+        jobs.append(dict(
+            aoi=wkb, crs=crs_wkt, dtm=dtm, memmap_dir=args.memmap_dir, camera=camera, mode=args.mode,
+            gsd=args.gsd, altitude_agl=args.altitude_agl,
+            min_height=args.min_height, max_height=args.max_height,
+            overlap=args.overlap, sidelap=args.sidelap, direction=args.direction,
+            optimize_direction=args.optimize_direction,
+            exceed=args.exceed, multiple_base=args.multiple_base, tolerance=args.tolerance,
+            envelope=args.envelope,
+            output=os.path.join(args.output_dir, f"{name}_{fid}_{args.mode}.gpkg")
+        ))
+    return jobs
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Plan photogrammetric block flights "
+                                     "over every polygon of the AoI file.")
+    parser.add_argument('aoi', help="vector file with Area of Interest polygons")
+    parser.add_argument('dtm', nargs='+', help="Digital Terrain Model raster, "
+                        "or its tiles given as files or directories")
+    parser.add_argument('--epsg', type=int, help="EPSG code of projected CRS of the plans, "
+                        "AoI is reprojected to it, CRS of the AoI file by default")
+    parser.add_argument('--camera', required=True, help="camera name from camera/cameras.json")
+    parser.add_argument('--mode', choices=MODES, default='one',
+                        help="altitude mode: one altitude ASL for entire flight, "
+                        "separate altitude ASL for each strip or terrain following")
+    altitude = parser.add_mutually_exclusive_group()
+    altitude.add_argument('--gsd', type=float, default=5.0, help="GSD [cm/px]")
+    altitude.add_argument('--altitude-agl', type=float, help="altitude AGL [m]")
+    parser.add_argument('--min-height', type=float, help="min terrain height [m], from DTM by default")
+    parser.add_argument('--max-height', type=float, help="max terrain height [m], from DTM by default")
+    parser.add_argument('--overlap', type=float, default=60.0, help="overlap [%%]")
+    parser.add_argument('--sidelap', type=float, default=30.0, help="sidelap [%%]")
+    parser.add_argument('--direction', type=float, default=0.0, help="flight direction [deg]")
+    parser.add_argument('--optimize-direction', choices=CRITERIA,
+                        help="use flight direction with the fewest photos or strips")
+    parser.add_argument('--exceed', type=float, default=25.0,
+                        help="exceed of extreme strips outside AoI [%%]")
+    parser.add_argument('--multiple-base', type=int, default=2,
+                        help="multiple of base exceed AoI")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="terrain following tolerance [m]")
+    parser.add_argument('--envelope', action='store_true',
+                        help="terrain following over the highest terrain under the whole photo swath")
+    parser.add_argument('--output-dir', default='.', help="directory of GeoPackages")
+    parser.add_argument('--memmap-dir', help="directory of decoded DTM shared by processes "
+                        "through memory mapping, DTM read in cached tiles by default")
+    parser.add_argument('--workers', type=int, help="number of processes, CPU count by default")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        jobs = make_jobs(args)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                output, photos_count, direction = future.result()
+                print(f"{output}: {photos_count} photos, direction {direction:.0f} [deg]")
+            except Exception as e:
+                failed += 1
+                print(f"{futures[future]['output']}: failed - {e}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
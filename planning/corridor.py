@@ -0,0 +1,153 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from math import atan, pi
+from ..mathgeo_utils.coordinates import line
+from .block import bounding_boxes, projection_centres, strips_projection_centres_number
+from .result import PlanResult
+
+
+def segment_angle(x_start, y_start, x_end, y_end):
+    """Return direction [deg] of corridor segment used as flight direction."""
+    a_line, _ = line(y_start, y_end, x_start, x_end)
+    angle = atan(a_line) * 180 / pi
+    if angle < 0:
+        angle += 180
+    if y_end - y_start < 0:
+        angle += 180
+    return angle
+
+
+def corridor_flight_numbering(boxes, Bx, By, len_across, mult_base, x_percent):
+    """Return dictionary with number of strips and photos
+    for each segment of corridor flight. Segments are given
+    by bounding boxes of buffered segments (bounding_box_at_angle)."""
+    nr_photos_in_strip = {}
+    for segment_nr, (a, b, a2, b2, Dx, Dy) in enumerate(boxes, 1):
+        Nx, Ny = strips_projection_centres_number(Dx, Dy, Bx, By,
+            len_across, mult_base, x_percent)
+        Nx = Nx - 2
+
+        nr_photos_in_strip[f"segment_{segment_nr}"] = Nx
+
+    photo = 1
+    strip = 1
+    all_directions = []
+    for direction in range(1, Ny+1):
+        if direction % 2 != 0:
+            last_strip, last_photo, strips_in_direction = forward(strip,
+                photo, nr_photos_in_strip)
+            strip = last_strip
+            photo = last_photo
+        else:
+            last_strip, last_photo, strips_in_direction = backward(strip,
+                photo, nr_photos_in_strip)
+            strip = last_strip
+            photo = last_photo
+        all_directions.append(strips_in_direction)
+
+    ordered_segments = {}
+    for n in range(1, len(boxes)+1):
+        segment_list = [d[f'segment_{n}'] for d in all_directions]
+        segment_dict = {}
+        for strip in segment_list:
+            segment_dict.update(strip)
+        ordered_segments[f'segment_{n}'] = segment_dict
+
+    return ordered_segments
+
+
+def forward(strip, photo, nr_photos_in_strip):
+    """Return dictionary with strip and photo numbers
+    for the forward direction of corridor flight."""
+    strips_forward = {}
+    for seg, n in nr_photos_in_strip.items():
+        photos = []
+        for _ in range(1, n + 1):
+            photos.append(photo)
+            photo += 1
+        strips_forward[seg] = {strip: photos}
+        strip += 1
+
+    return strip, photo, strips_forward
+
+
+def backward(strip, photo, nr_photos_in_strip):
+    """Return dictionary with strip and photo numbers
+    for the backward direction of corridor flight."""
+    strips_backward = {}
+    for seg, n in reversed(nr_photos_in_strip.items()):
+        photos = []
+        for _ in range(1, n + 1):
+            photos.append(photo)
+            photo += 1
+        strips_backward[seg] = {strip: photos[::-1]}
+        strip += 1
+
+    return strip, photo, strips_backward
+
+
+def explode_lines(lines):
+    """Return start and end points (S, 2 arrays) of all segments
+    of the lines (list of N, 2 arrays), skipping zero-length ones."""
+    starts = [np.asarray(l, dtype=float)[:-1, :2] for l in lines if len(l) > 1]
+    ends = [np.asarray(l, dtype=float)[1:, :2] for l in lines if len(l) > 1]
+    if not starts:
+        return np.empty((0, 2)), np.empty((0, 2))
+    starts, ends = np.vstack(starts), np.vstack(ends)
+    keep = np.any(starts != ends, axis=1)
+    return starts[keep], ends[keep]
+
+
+def segment_buffers(starts, ends, distance):
+    """Return vertices (S, 5, 2 array) of closed rings of flat-ended
+    buffers of the segments."""
+    direction = ends - starts
+    normal = np.column_stack((-direction[:, 1], direction[:, 0]))
+    normal *= distance / np.hypot(normal[:, 0], normal[:, 1])[:, np.newaxis]
+    return np.stack((starts + normal, ends + normal, ends - normal,
+                     starts - normal, starts + normal), axis=1)
+
+
+def plan_segment(angle, ring, box, Bx, By, Lx, Ly, x, m, H):
+    a, b, a2, b2, Dx, Dy = box
+    return projection_centres(angle, [ring], a, b, a2, b2, Dx, Dy,
+                              Bx, By, Lx, Ly, x, m, H)
+
+
+def plan_corridor(lines, distance, Bx, By, Lx, Ly, x, m, H, max_workers=None):
+    """Return plan result of corridor flight along the lines (list of
+    N, 2 arrays) and rings of buffers of its segments. Segments are
+    planned concurrently, numbered one after another as if planned in
+    sequence and then renumbered for the whole corridor at once."""
+    starts, ends = explode_lines(lines)
+    buffers = segment_buffers(starts, ends, distance)
+    angles = [segment_angle(x0, y0, x1, y1) for (x0, y0), (x1, y1) in zip(starts, ends)]
+    if not angles:
+        raise ValueError("Corridor line has no segments.")
+    boxes = bounding_boxes(angles, buffers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        plans = list(executor.map(
+            lambda args: plan_segment(*args, Bx, By, Lx, Ly, x, m, H),
+            zip(angles, buffers, boxes)
+        ))
+    plan = PlanResult.chain(plans)
+
+    ordered_segments = corridor_flight_numbering(boxes, Bx, By, Ly, m, x)
+    number_segments(plan, ordered_segments)
+    return plan, buffers
+
+
+def number_segments(plan, ordered_segments):
+    """Set corridor strip and photo numbers of every segment
+    in the order its photos were generated."""
+    for segment_nr in range(1, plan.segment.max(initial=0) + 1):
+        segment = ordered_segments[f'segment_{segment_nr}']
+        strips = [s for s, photos in segment.items() for _ in photos]
+        photos = [p for photos in segment.values() for p in photos]
+        rows = np.flatnonzero(plan.segment == segment_nr)
+        if len(rows) != len(photos):
+            raise ValueError(f"Corridor segment {segment_nr} has {len(rows)} photos "
+                             f"but its numbering has {len(photos)}.")
+        plan.strip[rows] = strips
+        plan.photo[rows] = photos
@@ -0,0 +1,129 @@
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+gdal.UseExceptions()
+ogr.UseExceptions()
+
+PC_FIELDS = [
+    ("Strip", ogr.OFTString),
+    ("Photo Number", ogr.OFTString),
+    ("X [m]", ogr.OFTReal),
+    ("Y [m]", ogr.OFTReal),
+    ("Alt. ASL [m]", ogr.OFTReal),
+    ("Alt. AGL [m]", ogr.OFTReal),
+    ("Omega [deg]", ogr.OFTReal),
+    ("Phi [deg]", ogr.OFTReal),
+    ("Kappa [deg]", ogr.OFTReal),
+]
+PHOTO_FIELDS = [
+    ("Strip", ogr.OFTString),
+    ("Photo Number", ogr.OFTString),
+]
+WAYPOINT_FIELDS = [
+    ("Waypoint Number", ogr.OFTInteger),
+    ("X [m]", ogr.OFTReal),
+    ("Y [m]", ogr.OFTReal),
+    ("Alt. ASL [m]", ogr.OFTReal),
+    ("Alt. AGL [m]", ogr.OFTReal),
+]
+
+
+def rings_polygon(rings):
+    """Return OGR polygon made of rings (list of N, 2 arrays)."""
+    polygon = ogr.Geometry(ogr.wkbPolygon)
+    for vertices in rings:
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+        for x, y in vertices:
+            ring.AddPoint_2D(float(x), float(y))
+        ring.CloseRings()
+        polygon.AddGeometry(ring)
+    return polygon
+
+
+def read_polygons(path, epsg=None):
+    """Return WKT of CRS and list of (feature id, WKB) of all polygon
+    features of the first layer of vector file. With EPSG code polygons
+    are reprojected to its CRS, or taken to be in it if the layer has no CRS."""
+    source = ogr.Open(path)
+    layer = source.GetLayer(0)
+    srs = layer.GetSpatialRef()
+    transformation = None
+    if epsg is not None:
+        target = osr.SpatialReference()
+        target.ImportFromEPSG(epsg)
+        target.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        if srs is not None and not srs.IsSame(target):
+            srs = srs.Clone()
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            transformation = osr.CoordinateTransformation(srs, target)
+        srs = target
+    polygons = []
+    for feature in layer:
+        geom = feature.GetGeometryRef()
+        if geom is None or ogr.GT_Flatten(geom.GetGeometryType()) not in (
+                ogr.wkbPolygon, ogr.wkbMultiPolygon):
+            continue
+        if transformation is not None:
+            geom.Transform(transformation)
+        polygons.append((feature.GetFID(), bytes(geom.ExportToWkb())))
+    return srs.ExportToWkt() if srs else None, polygons
+
+
+def create_layer(source, name, geom_type, srs, fields):
+    layer = source.CreateLayer(name, srs, geom_type)
+    for field_name, field_type in fields:
+        layer.CreateField(ogr.FieldDefn(field_name, field_type))
+    return layer
+
+
+def add_feature(layer, geom, attributes):
+    feature = ogr.Feature(layer.GetLayerDefn())
+    feature.SetGeometry(geom)
+    for i, value in enumerate(attributes):
+        if value is not None:
+            feature.SetField(i, value)
+    layer.CreateFeature(feature)
+
+
+def point(x, y):
+    geom = ogr.Geometry(ogr.wkbPoint)
+    geom.AddPoint_2D(float(x), float(y))
+    return geom
+
+
+def rounded(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def write_plan(path, plan, waypoints, crs_wkt):
+    """Write projection centres, photos, waypoints and flight line
+    of the plan to GeoPackage. Waypoints are rows of x, y,
+    altitude ASL and altitude AGL."""
+    srs = osr.SpatialReference()
+    if crs_wkt:
+        srs.ImportFromWkt(crs_wkt)
+    source = ogr.GetDriverByName('GPKG').CreateDataSource(path)
+    pc_layer = create_layer(source, 'projection_centres', ogr.wkbPoint, srs, PC_FIELDS)
+    photo_layer = create_layer(source, 'photos', ogr.wkbPolygon, srs, PHOTO_FIELDS)
+    waypoints_layer = create_layer(source, 'waypoints', ogr.wkbPoint, srs, WAYPOINT_FIELDS)
+    line_layer = create_layer(source, 'flight_line', ogr.wkbLineString25D, srs, [])
+
+    source.StartTransaction()
+    for i in range(len(plan)):
+        s_nr, p_nr = f"{plan.strip[i]:04d}", f"{plan.photo[i]:05d}"
+        add_feature(pc_layer, point(plan.x[i], plan.y[i]),
+                    [s_nr, p_nr, rounded(plan.x[i]), rounded(plan.y[i]), rounded(plan.z[i]),
+                     rounded(plan.agl[i]), 0, 0, float(plan.kappa[i])])
+        corners = np.column_stack((plan.corners_x[i], plan.corners_y[i]))
+        add_feature(photo_layer, rings_polygon([corners]), [s_nr, p_nr])
+
+    for waypoint_nr, (x, y, z, agl) in enumerate(waypoints, 1):
+        add_feature(waypoints_layer, point(x, y),
+                    [waypoint_nr, rounded(x), rounded(y), rounded(z), rounded(agl)])
+
+    flight_line = ogr.Geometry(ogr.wkbLineString25D)
+    for x, y, z, _ in waypoints:
+        flight_line.AddPoint(float(x), float(y), float(z))
+    add_feature(line_layer, flight_line, [])
+    source.CommitTransaction()
+    source = None
@@ -0,0 +1,48 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from ..mathgeo_utils.algebra import extents_at_angles
+from .block import strips_projection_centres_number
+from .parameters import block_direction
+
+CRITERIA = ('photos', 'strips')
+COST_DTYPE = [('direction', float), ('photos', int), ('strips', int)]
+
+
+def direction_costs(vertices, Bx, By, Ly, x, m, directions=None, max_workers=None):
+    """Return cost table (structured array) of block flight over the range
+    given by its vertices for every flight direction [deg] measured from
+    north. Numbers of strips and photos come from the closed-form counts
+    of strips_projection_centres_number, so every photo of the grid
+    is counted, also the ones later skipped outside the range."""
+    if directions is None:
+        directions = np.arange(0, 180, 1.0)
+    directions = np.asarray(directions, dtype=float)
+    alphas = np.array([block_direction(d) for d in directions])
+
+    workers = max_workers or os.cpu_count() or 1
+    chunks = np.array_split(np.arange(len(alphas)), workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        extents = list(executor.map(
+            lambda chunk: extents_at_angles(alphas[chunk], vertices), chunks))
+    Dx = np.concatenate([e[0] for e in extents])
+    Dy = np.concatenate([e[1] for e in extents])
+
+    Nx, Ny = np.vectorize(strips_projection_centres_number, otypes=[int, int])(Dx, Dy, Bx, By, Ly, m, x)
+
+    costs = np.zeros(len(directions), dtype=COST_DTYPE)
+    costs['direction'] = directions
+    costs['photos'] = Nx * Ny
+    costs['strips'] = Ny
+    return costs
+
+
+def best_direction(costs, criterion='photos'):
+    """Return the direction of the lowest cost by criterion,
+    with the other criteria breaking ties, and the cost table
+    sorted from the best direction."""
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion '{criterion}', use one of {CRITERIA}.")
+    keys = [costs[c] for c in CRITERIA if c != criterion][::-1] + [costs[criterion]]
+    ranked = costs[np.lexsort(keys)]
+    return float(ranked['direction'][0]), ranked
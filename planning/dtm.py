@@ -0,0 +1,477 @@
+import os
+import threading
+import numpy as np
+from osgeo import gdal, ogr
+from ..mathgeo_utils.coordinates import crs2pixel, pixel2crs
+from .cache import PlanCache, fingerprint, plan_cache, source_fingerprint
+from .geometry import row_intervals
+
+gdal.UseExceptions()
+ogr.UseExceptions()
+
+TILE_SIZE = 256
+CELL_SIZE = 32
+WARP_NODATA = -9999
+MOSAIC_PREFIX = 'dtm_mosaic_'
+RASTER_EXTENSIONS = ('.tif', '.tiff', '.asc', '.img', '.dem', '.bil', '.flt', '.jp2', '.vrt')
+
+
+def tile_size(block_size):
+    """Return size of cached tile, multiple of native block size
+    not smaller than TILE_SIZE (GeoTIFF strips are one row high)."""
+    return block_size * -(-TILE_SIZE // block_size)
+
+
+class DTMStore():
+    """Digital Terrain Model opened once with GDAL and read in tiles
+    kept in LRU cache. Heights are float32 with NaN for nodata.
+    DTMs larger than the cache are decoded once to a memory-mapped
+    file in memmap_dir if given."""
+
+    def __init__(self, path, cache_bytes=256 * 1024 * 1024, memmap_dir=None) -> None:
+        self.path = path
+        self.source = source_fingerprint(path)
+        self.dataset = gdal.Open(path)
+        self.band = self.dataset.GetRasterBand(1)
+        self.geotransf = self.dataset.GetGeoTransform()
+        self.nodata = self.band.GetNoDataValue()
+        self.crs_wkt = self.dataset.GetProjection()
+        self.width = self.dataset.RasterXSize
+        self.height = self.dataset.RasterYSize
+        block_width, block_height = self.band.GetBlockSize()
+        self.tile_width, self.tile_height = tile_size(block_width), tile_size(block_height)
+        self.tiles_across = -(-self.width // self.tile_width)
+        tile_bytes = self.tile_width * self.tile_height * 4
+        self.tiles = PlanCache(max_entries=cache_bytes // tile_bytes + 1,
+                               max_bytes=cache_bytes, copies=False)
+        self.lock = threading.Lock()
+        self._minmax = None
+        self._cells = None
+        self._footprint = None
+        self.heights = None
+        if memmap_dir is not None and self.width * self.height * 4 > cache_bytes:
+            self.heights = self.decoded(memmap_dir)
+
+    def minmax(self):
+        """Return min and max height of entire DTM."""
+        if self._minmax is None:
+            with self.lock:
+                h_min, h_max = self.band.ComputeRasterMinMax(False)
+            self._minmax = float(h_min), float(h_max)
+        return self._minmax
+
+    def decode(self, raw):
+        """Return raw band values as float32 with NaN for nodata."""
+        heights = raw.astype(np.float32)
+        if self.nodata is not None:
+            heights[raw == self.nodata] = np.nan
+        return heights
+
+    def decoded(self, directory):
+        """Return read-only memmap of entire DTM decoded to float32 in
+        file of directory named by source, written once per source."""
+        output = os.path.join(directory, f"dtm_{fingerprint('decoded', self.source)}.f32")
+        shape = (self.height, self.width)
+        if not os.path.exists(output):
+            partial = f"{output}.{os.getpid()}.{threading.get_ident()}.part"
+            heights = np.memmap(partial, dtype=np.float32, mode='w+', shape=shape)
+            for row in range(0, self.height, self.tile_height):
+                rows = min(self.tile_height, self.height - row)
+                with self.lock:
+                    raw = self.band.ReadAsArray(0, row, self.width, rows)
+                heights[row:row + rows] = self.decode(raw)
+            heights.flush()
+            del heights
+            os.replace(partial, output)
+        return np.memmap(output, dtype=np.float32, mode='r', shape=shape)
+
+    def tile(self, i, j):
+        """Return read-only tile in i-th row and j-th column of tiles."""
+        row, col = i * self.tile_height, j * self.tile_width
+        if self.heights is not None:
+            return self.heights[row:row + self.tile_height, col:col + self.tile_width]
+        tile = self.tiles.get((i, j))
+        if tile is None:
+            with self.lock:
+                tile = self.band.ReadAsArray(col, row, min(self.tile_width, self.width - col),
+                                             min(self.tile_height, self.height - row))
+            tile = self.decode(tile)
+            tile.setflags(write=False)
+            self.tiles.put((i, j), tile)
+        return tile
+
+    def read(self, col, row, width, height):
+        """Return float32 window of heights, NaN outside the DTM."""
+        window = np.full((max(height, 0), max(width, 0)), np.nan, dtype=np.float32)
+        r0, r1 = max(row, 0), min(row + height, self.height)
+        c0, c1 = max(col, 0), min(col + width, self.width)
+        if r0 >= r1 or c0 >= c1:
+            return window
+        th, tw = self.tile_height, self.tile_width
+        for i in range(r0 // th, (r1 - 1) // th + 1):
+            for j in range(c0 // tw, (c1 - 1) // tw + 1):
+                tile = self.tile(i, j)
+                tr0, tr1 = max(r0, i * th), min(r1, i * th + tile.shape[0])
+                tc0, tc1 = max(c0, j * tw), min(c1, j * tw + tile.shape[1])
+                window[tr0 - row:tr1 - row, tc0 - col:tc1 - col] = \
+                    tile[tr0 - i * th:tr1 - i * th, tc0 - j * tw:tc1 - j * tw]
+        return window
+
+    def pixels(self, rows, cols):
+        """Return heights of pixels given by row and column indexes,
+        NaN outside the DTM."""
+        rows = np.asarray(rows, dtype=int)
+        cols = np.asarray(cols, dtype=int)
+        heights = np.full(rows.shape, np.nan)
+        flat_rows, flat_cols, flat_heights = rows.ravel(), cols.ravel(), heights.reshape(-1)
+        inside = np.flatnonzero((flat_rows >= 0) & (flat_rows < self.height) &
+                                (flat_cols >= 0) & (flat_cols < self.width))
+        keys = (flat_rows[inside] // self.tile_height) * self.tiles_across \
+            + flat_cols[inside] // self.tile_width
+        order = np.argsort(keys, kind='stable')
+        keys, inside = keys[order], inside[order]
+        bounds = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True]) if len(keys) else []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            i, j = divmod(int(keys[start]), self.tiles_across)
+            idx = inside[start:end]
+            flat_heights[idx] = self.tile(i, j)[flat_rows[idx] - i * self.tile_height,
+                                                flat_cols[idx] - j * self.tile_width]
+        return heights
+
+    def sample(self, x, y, transformer=None, method='nearest'):
+        """Return terrain heights at x, y coordinate arrays, transformed
+        to raster CRS by pyproj transformer in one call if given.
+        Method is 'nearest' or 'bilinear' (nearest at the DTM edges)."""
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        if transformer is not None:
+            x, y = transformer.transform(x, y)
+        c, r = crs2pixel(self.geotransf, np.asarray(x), np.asarray(y))
+        heights = self.pixels(np.floor(r), np.floor(c))
+        if method == 'bilinear':
+            c0, r0 = np.floor(c - 0.5), np.floor(r - 0.5)
+            dc, dr = c - 0.5 - c0, r - 0.5 - r0
+            bilinear = (self.pixels(r0, c0) * (1 - dc) * (1 - dr) +
+                        self.pixels(r0, c0 + 1) * dc * (1 - dr) +
+                        self.pixels(r0 + 1, c0) * (1 - dc) * dr +
+                        self.pixels(r0 + 1, c0 + 1) * dc * dr)
+            heights = np.where(np.isnan(bilinear), heights, bilinear)
+        elif method != 'nearest':
+            raise ValueError(f"Unknown sampling method '{method}'.")
+        return heights
+
+    def cells(self):
+        """Return min and max heights and counts of valid pixels (3 arrays)
+        of square cells of CELL_SIZE pixels covering the DTM, computed once.
+        The DTM is read once at full resolution, one band of cells at a time:
+        overviews are resampled, so they would not give exact extremes."""
+        if self._cells is None:
+            size = CELL_SIZE
+            cells_across = -(-self.width // size)
+            cell_min, cell_max, cell_valid = [], [], []
+            for row in range(0, self.height, size):
+                band = self.read(0, row, cells_across * size, size).reshape(size, cells_across, size)
+                cell_min.append(np.fmin.reduce(np.fmin.reduce(band, axis=2), axis=0))
+                cell_max.append(np.fmax.reduce(np.fmax.reduce(band, axis=2), axis=0))
+                cell_valid.append((~np.isnan(band)).sum(axis=(0, 2)))
+            self._cells = np.array(cell_min), np.array(cell_max), np.array(cell_valid)
+        return self._cells
+
+    def cell_minmax(self):
+        """Return min and max heights (2 arrays) of cells of the DTM."""
+        return self.cells()[:2]
+
+    def valid_cells(self):
+        """Return boolean array of cells with valid heights in all
+        their pixels inside the DTM."""
+        cell_valid = self.cells()[2]
+        cell_rows = np.minimum(CELL_SIZE, self.height - np.arange(cell_valid.shape[0]) * CELL_SIZE)
+        cell_cols = np.minimum(CELL_SIZE, self.width - np.arange(cell_valid.shape[1]) * CELL_SIZE)
+        return cell_valid == cell_rows[:, None] * cell_cols[None, :]
+
+    def overview(self):
+        """Return the coarsest overview band and its reduction factor,
+        a divisor of CELL_SIZE, or None if the DTM has no such overview."""
+        best = None
+        for k in range(self.band.GetOverviewCount()):
+            overview = self.band.GetOverview(k)
+            factor = round(self.width / overview.XSize)
+            if factor <= CELL_SIZE and CELL_SIZE % factor == 0 and (best is None or factor > best[1]):
+                best = overview, factor
+        return best
+
+    def overview_valid_cells(self, overview, factor):
+        """Return boolean array of cells with valid data in all their
+        pixels of overview (reduced by factor) inside the DTM."""
+        size = CELL_SIZE // factor
+        mask = overview.GetMaskBand()
+        cells_down, cells_across = -(-self.height // CELL_SIZE), -(-self.width // CELL_SIZE)
+        valid = np.empty((cells_down, cells_across), dtype=bool)
+        for i in range(cells_down):
+            rows = max(min(size, overview.YSize - i * size), 0)
+            with self.lock:
+                band = mask.ReadAsArray(0, i * size, overview.XSize, rows) if rows else None
+            padded = np.ones((max(rows, 1), cells_across * size), dtype=bool)
+            if rows:
+                padded[:, :overview.XSize] = band > 0
+            valid[i] = padded.reshape(len(padded), cells_across, size).all(axis=(0, 2))
+        return valid
+
+    def footprint_wkb(self):
+        """Return WKB of polygon covered by cells with valid heights in all
+        their pixels, clipped to the DTM extent, computed once. Cells are
+        checked on the coarsest overview not coarser than a cell if the DTM
+        has one (holes smaller than its pixels may be missed), otherwise on
+        the DTM itself. Partly valid cells are left out, so the footprint is
+        meant to accept polygons quickly, not to reject them."""
+        if self._footprint is None:
+            size = CELL_SIZE
+            overview = self.overview()
+            valid = self.overview_valid_cells(*overview) if overview else self.valid_cells()
+            valid = valid.astype(np.uint8)
+            gt = self.geotransf
+            mask_ds = gdal.GetDriverByName('MEM').Create('', valid.shape[1], valid.shape[0], 1, gdal.GDT_Byte)
+            mask_ds.SetGeoTransform((gt[0], gt[1] * size, gt[2] * size, gt[3], gt[4] * size, gt[5] * size))
+            mask_band = mask_ds.GetRasterBand(1)
+            mask_band.WriteArray(valid)
+            vector_ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+            layer = vector_ds.CreateLayer('footprint')
+            layer.CreateField(ogr.FieldDefn('valid', ogr.OFTInteger))
+            gdal.Polygonize(mask_band, mask_band, layer, 0)
+
+            footprint = ogr.Geometry(ogr.wkbMultiPolygon)
+            for feature in layer:
+                footprint.AddGeometry(feature.GetGeometryRef())
+            extent = ogr.Geometry(ogr.wkbLinearRing)
+            for c, r in ((0, 0), (self.width, 0), (self.width, self.height), (0, self.height), (0, 0)):
+                extent.AddPoint_2D(*pixel2crs(gt, c, r))
+            extent_polygon = ogr.Geometry(ogr.wkbPolygon)
+            extent_polygon.AddGeometry(extent)
+            footprint = footprint.UnionCascaded().Intersection(extent_polygon)
+            self._footprint = bytes(footprint.ExportToWkb())
+        return self._footprint
+
+    def pixel_intervals(self, rings, transformer=None):
+        """Return rows and half-open column ranges (3 arrays) of pixels
+        with centres inside the polygon made of rings (N, 2 arrays),
+        transformed to raster CRS by pyproj transformer if given.
+        Pixels may lie outside the DTM."""
+        pixel_rings = []
+        for ring in rings:
+            x, y = ring[:, 0], ring[:, 1]
+            if transformer is not None:
+                x, y = transformer.transform(x, y)
+            c, r = crs2pixel(self.geotransf, np.asarray(x), np.asarray(y))
+            pixel_rings.append(np.column_stack((c, r)))
+        if not pixel_rings:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=int)
+        r = np.concatenate([ring[:, 1] for ring in pixel_rings])
+        return row_intervals(pixel_rings, int(np.floor(r.min())), int(np.ceil(r.max())) + 1)
+
+    def minmax_in_rings(self, rings, transformer=None):
+        """Return min and max terrain height of pixels with centres inside
+        the polygon made of rings (N, 2 arrays), transformed to raster CRS
+        by pyproj transformer if given. Cells lying entirely inside are
+        answered from the cell index, pixels are read only at the edges."""
+        rows, starts, ends = self.pixel_intervals(rings, transformer)
+        starts, ends = np.clip(starts, 0, self.width), np.clip(ends, 0, self.width)
+        keep = (starts < ends) & (rows >= 0) & (rows < self.height)
+        rows, starts, ends = rows[keep], starts[keep], ends[keep]
+        if len(rows) == 0:
+            raise ValueError("Could not determine min/max values from raster.")
+
+        size = CELL_SIZE
+        cell_min, cell_max = self.cell_minmax()
+        cells_across = cell_min.shape[1]
+        band = rows // size
+        full_lo = -(-starts // size)
+        full_hi = np.where(ends == self.width, cells_across, ends // size)
+        touch_lo, touch_hi = starts // size, (ends - 1) // size + 1
+        b0, k0 = band.min(), touch_lo.min()
+        shape = (band.max() - b0 + 1, touch_hi.max() - k0 + 1)
+
+        covered = np.zeros(shape, dtype=int)
+        full = full_lo < full_hi
+        np.add.at(covered, (band[full] - b0, full_lo[full] - k0), 1)
+        np.add.at(covered, (band[full] - b0, full_hi[full] - k0), -1)
+        touched = np.zeros(shape, dtype=int)
+        np.add.at(touched, (band - b0, touch_lo - k0), 1)
+        np.add.at(touched, (band - b0, touch_hi - k0), -1)
+        covered, touched = np.cumsum(covered, axis=1)[:, :-1], np.cumsum(touched, axis=1)[:, :-1]
+
+        band_rows = np.minimum(size, self.height - np.arange(b0, b0 + shape[0]) * size)
+        inner = covered == band_rows[:, None]
+        window = (slice(b0, b0 + shape[0]), slice(k0, k0 + shape[1] - 1))
+        h_min = np.fmin.reduce(cell_min[window][inner], initial=np.nan)
+        h_max = np.fmax.reduce(cell_max[window][inner], initial=np.nan)
+
+        cols = np.arange(size)
+        for b, k in zip(*np.nonzero((touched > 0) & ~inner)):
+            i, j = b + b0, k + k0
+            if cell_min[i, j] >= h_min and cell_max[i, j] <= h_max:
+                continue
+            r0, c0 = i * size, j * size
+            first, last = np.searchsorted(rows, [r0, r0 + size])
+            sel = np.arange(first, last)
+            sel = sel[(starts[sel] < c0 + size) & (ends[sel] > c0)]
+            inside = np.zeros((size, size), dtype=bool)
+            np.logical_or.at(inside, rows[sel] - r0,
+                             (cols >= starts[sel, None] - c0) & (cols < ends[sel, None] - c0))
+            values = self.read(c0, r0, size, size)[inside]
+            h_min = np.fmin.reduce(values, initial=h_min)
+            h_max = np.fmax.reduce(values, initial=h_max)
+
+        if np.isnan(h_min):
+            raise ValueError("Could not determine min/max values from raster.")
+        return float(h_min), float(h_max)
+
+    def invalid_in_rings(self, rings, transformer=None):
+        """Return fraction of pixels with centres inside the polygon made
+        of rings (N, 2 arrays) that have no valid height (nodata or outside
+        the DTM) and raster CRS coordinates (N, 2 array) of their centres.
+        Only pixels in bands of cells covering the polygon are read, and
+        none of those known to be valid from the cell index if it is built."""
+        rows, starts, ends = self.pixel_intervals(rings, transformer)
+        total = int((ends - starts).sum())
+        if total == 0:
+            return 0.0, np.empty((0, 2))
+
+        size = CELL_SIZE
+        all_valid = self.valid_cells() if self._cells is not None else np.zeros((0, 0), dtype=bool)
+
+        invalid_rows, invalid_cols = [], []
+        band = rows // size
+        bounds = np.flatnonzero(np.r_[True, band[1:] != band[:-1], True])
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            b, r0 = band[first], band[first] * size
+            c0, c1 = starts[first:last].min(), ends[first:last].max()
+            if 0 <= b < all_valid.shape[0] and c0 >= 0 and c1 <= self.width \
+                    and all_valid[b, c0 // size:(c1 - 1) // size + 1].all():
+                continue
+            cols = np.arange(c1 - c0)
+            inside = np.zeros((size, c1 - c0), dtype=bool)
+            np.logical_or.at(inside, rows[first:last] - r0,
+                             (cols >= starts[first:last, None] - c0) & (cols < ends[first:last, None] - c0))
+            r, c = np.nonzero(inside & np.isnan(self.read(c0, r0, c1 - c0, size)))
+            invalid_rows.append(r + r0)
+            invalid_cols.append(c + c0)
+
+        if not invalid_rows:
+            return 0.0, np.empty((0, 2))
+        invalid_rows, invalid_cols = np.concatenate(invalid_rows), np.concatenate(invalid_cols)
+        x, y = pixel2crs(self.geotransf, invalid_cols + 0.5, invalid_rows + 0.5)
+        return len(invalid_rows) / total, np.column_stack((x, y))
+
+
+stores = PlanCache(max_entries=4, copies=False)
+memmap_directory = None
+
+
+def set_memmap_directory(directory):
+    """Set directory of memory-mapped DTMs opened by open_dtm."""
+    global memmap_directory
+    memmap_directory = directory
+
+
+def open_dtm(path, memmap_dir=None):
+    """Return DTM store of raster file, shared by all callers
+    until the file changes."""
+    key = source_fingerprint(path)
+    return stores.get_or_compute(
+        key, lambda: DTMStore(path, memmap_dir=memmap_dir or memmap_directory))
+
+
+def snapped_bounds(extent, margin):
+    """Return bounds (x_min, y_min, x_max, y_max) of extent enlarged
+    by margin and snapped outwards to multiples of margin."""
+    x_min, y_min, x_max, y_max = extent
+    return (np.floor((x_min - margin) / margin) * margin, np.floor((y_min - margin) / margin) * margin,
+            np.ceil((x_max + margin) / margin) * margin, np.ceil((y_max + margin) / margin) * margin)
+
+
+def warp_window(path, dst_crs, extent, margin, directory):
+    """Return path of GeoTIFF with DTM warped to dst_crs over extent
+    (x_min, y_min, x_max, y_max in dst_crs) enlarged by margin. The file
+    is named by source, CRS and window, so it is reused by later runs.
+    Parts of the window not covered by the source are nodata."""
+    bounds = snapped_bounds(extent, margin)
+    key = fingerprint('warp', source_fingerprint(path), dst_crs, bounds)
+    output = os.path.join(directory, f"dtm_{key}.tif")
+    if not os.path.exists(output):
+        nodata = gdal.Open(path).GetRasterBand(1).GetNoDataValue()
+        partial = output + '.part'
+        gdal.Warp(partial, path, format='GTiff', dstSRS=dst_crs, outputBounds=bounds,
+                  resampleAlg='near', dstNodata=WARP_NODATA if nodata is None else nodata,
+                  creationOptions=['TILED=YES'])
+        os.replace(partial, output)
+    return output
+
+
+def tile_paths(sources):
+    """Return paths of DTM tiles given as files or directories
+    of files with RASTER_EXTENSIONS."""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(sorted(os.path.join(source, name) for name in os.listdir(source)
+                                if name.lower().endswith(RASTER_EXTENSIONS)))
+        else:
+            paths.append(source)
+    return [os.path.abspath(path) for path in paths]
+
+
+def tile_bounds(paths):
+    """Return (N, 4) array of bounds (x_min, y_min, x_max, y_max)
+    of tiles, read once until any of them changes."""
+    def bounds():
+        tiles = np.empty((len(paths), 4))
+        for k, path in enumerate(paths):
+            dataset = gdal.Open(path)
+            x0, dx, _, y0, _, dy = dataset.GetGeoTransform()
+            x1, y1 = x0 + dx * dataset.RasterXSize, y0 + dy * dataset.RasterYSize
+            tiles[k] = min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+        return tiles
+
+    key = fingerprint('tile_bounds', [source_fingerprint(path) for path in paths])
+    return plan_cache.get_or_compute(key, bounds)
+
+
+def build_mosaic(sources, directory, extent=None):
+    """Return path of VRT mosaic of DTM tiles given as files or
+    directories, limited to tiles intersecting extent (x_min, y_min,
+    x_max, y_max in tiles CRS) if given. Tiles are opened by GDAL only
+    when their blocks are read. The file is named by tiles, so it is
+    reused by later runs."""
+    paths = tile_paths(sources)
+    if not paths:
+        raise ValueError("No DTM tiles found.")
+    if extent is not None:
+        x_min, y_min, x_max, y_max = extent
+        bounds = tile_bounds(paths)
+        intersecting = ((bounds[:, 0] <= x_max) & (bounds[:, 2] >= x_min) &
+                        (bounds[:, 1] <= y_max) & (bounds[:, 3] >= y_min))
+        paths = [path for path, inside in zip(paths, intersecting) if inside]
+        if not paths:
+            raise ValueError("No DTM tile intersects the area.")
+    key = fingerprint('mosaic', [source_fingerprint(path) for path in paths])
+    output = os.path.join(directory, f"{MOSAIC_PREFIX}{key}.vrt")
+    if not os.path.exists(output):
+        partial = f"{output}.{os.getpid()}.part"
+        gdal.BuildVRT(partial, paths)
+        os.replace(partial, output)
+    return output
+
+
+def is_mosaic(path):
+    """Return True if path is VRT mosaic made by build_mosaic."""
+    return os.path.basename(path).startswith(MOSAIC_PREFIX)
+
+
+def mosaic_window(path, extent):
+    """Return path of mosaic of those tiles of mosaic path which intersect
+    extent (x_min, y_min, x_max, y_max in tiles CRS), written next to it.
+    Other DTMs are returned unchanged."""
+    if not is_mosaic(path):
+        return path
+    tiles = [name for name in gdal.Open(path).GetFileList()[1:]
+             if name.lower().endswith(RASTER_EXTENSIONS)]
+    return build_mosaic(tiles, os.path.dirname(path), extent)
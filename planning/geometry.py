@@ -0,0 +1,174 @@
+import numpy as np
+
+
+def ring_edges(rings):
+    """Return start and end points (E, 2 arrays) of edges of all rings."""
+    starts, ends = [], []
+    for ring in rings:
+        ring = np.asarray(ring, dtype=float)
+        if len(ring) < 2:
+            continue
+        if not np.array_equal(ring[0], ring[-1]):
+            ring = np.vstack((ring, ring[:1]))
+        starts.append(ring[:-1])
+        ends.append(ring[1:])
+    if not starts:
+        return np.empty((0, 2)), np.empty((0, 2))
+    return np.vstack(starts), np.vstack(ends)
+
+
+def merge_intervals(intervals):
+    """Return sorted, disjoint union of closed intervals (K, 2 array)."""
+    intervals = np.asarray(intervals, dtype=float).reshape(-1, 2)
+    if intervals.size == 0:
+        return intervals
+    intervals = intervals[np.argsort(intervals[:, 0], kind='stable')]
+    reach = np.maximum.accumulate(intervals[:, 1])
+    starts = np.r_[True, intervals[1:, 0] > reach[:-1]]
+    groups = np.flatnonzero(starts)
+    lo = intervals[groups, 0]
+    hi = np.maximum.reduceat(intervals[:, 1], groups)
+    return np.column_stack((lo, hi))
+
+
+def distance_to_intervals(t, intervals):
+    """Return distance of every value t to the union of sorted,
+    disjoint intervals (inf when there are no intervals)."""
+    t = np.asarray(t, dtype=float)
+    if intervals.size == 0:
+        return np.full(t.shape, np.inf)
+    lo, hi = intervals[:, 0], intervals[:, 1]
+    i = np.searchsorted(lo, t, side='right') - 1
+    left = np.where(i >= 0, t - hi[np.clip(i, 0, None)], np.inf)
+    right = np.where(i + 1 < len(lo), lo[np.clip(i + 1, None, len(lo) - 1)] - t, np.inf)
+    return np.maximum(np.minimum(left, right), 0)
+
+
+def band_intervals(rings, xs, ys, alpha, half_width, t_start, t_end):
+    """Return along-track intervals covered by the polygon clipped to the
+    rectangle of the strip starting at (xs, ys) in direction alpha [deg].
+    The rectangle spans t_start..t_end along track and +-half_width across.
+    The outline of the clipped polygon is made of polygon edges clipped
+    to the rectangle and of rectangle sides lying inside the polygon,
+    so both are projected on the strip axis."""
+    p, q = ring_edges(rings)
+    cos_a, sin_a = np.cos(np.radians(alpha)), np.sin(np.radians(alpha))
+    t0 = (p[:, 0] - xs) * cos_a + (p[:, 1] - ys) * sin_a
+    u0 = -(p[:, 0] - xs) * sin_a + (p[:, 1] - ys) * cos_a
+    t1 = (q[:, 0] - xs) * cos_a + (q[:, 1] - ys) * sin_a
+    u1 = -(q[:, 0] - xs) * sin_a + (q[:, 1] - ys) * cos_a
+    dt, du = t1 - t0, u1 - u0
+
+    # Liang-Barsky clipping of every edge to the rectangle
+    s_lo = np.zeros(len(t0))
+    s_hi = np.ones(len(t0))
+    valid = np.ones(len(t0), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for pk, qk in ((-dt, t0 - t_start), (dt, t_end - t0),
+                       (-du, u0 + half_width), (du, half_width - u0)):
+            ratio = qk / pk
+            s_lo = np.where(pk < 0, np.maximum(s_lo, ratio), s_lo)
+            s_hi = np.where(pk > 0, np.minimum(s_hi, ratio), s_hi)
+            valid &= ~((pk == 0) & (qk < 0))
+    valid &= s_lo <= s_hi
+    ta = t0[valid] + dt[valid] * s_lo[valid]
+    tb = t0[valid] + dt[valid] * s_hi[valid]
+    intervals = [np.column_stack((np.minimum(ta, tb), np.maximum(ta, tb)))]
+
+    # parts of the long rectangle sides lying inside the polygon
+    for side in (-half_width, half_width):
+        crossing = (u0 > side) != (u1 > side)
+        t_cross = np.sort(t0[crossing] + (side - u0[crossing]) / du[crossing] * dt[crossing])
+        inside = t_cross.reshape(-1, 2)
+        inside = np.column_stack((np.maximum(inside[:, 0], t_start),
+                                  np.minimum(inside[:, 1], t_end)))
+        intervals.append(inside[inside[:, 0] <= inside[:, 1]])
+
+    return merge_intervals(np.vstack(intervals))
+
+
+def row_intervals(rings, row_start, row_end):
+    """Return rows and half-open column ranges (3 arrays) of pixels
+    with centres inside the polygon made of rings given in pixel
+    coordinates (column, row), for rows row_start..row_end-1.
+    Rows are scanned with the even-odd rule, sorted by row and column."""
+    p, q = ring_edges(rings)
+    y0, y1 = p[:, 1] - 0.5, q[:, 1] - 0.5
+    lo = np.clip(np.ceil(np.minimum(y0, y1)), row_start, row_end).astype(int)
+    hi = np.clip(np.ceil(np.maximum(y0, y1)), row_start, row_end).astype(int)
+    count = np.maximum(hi - lo, 0)
+    edge = np.repeat(np.arange(len(p)), count)
+    rows = np.repeat(lo, count) + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    t = (rows + 0.5 - p[edge, 1]) / (q[edge, 1] - p[edge, 1])
+    x = p[edge, 0] + t * (q[edge, 0] - p[edge, 0])
+    order = np.lexsort((x, rows))
+    rows, x = rows[order][0::2], x[order]
+    starts, ends = np.ceil(x[0::2] - 0.5).astype(int), np.ceil(x[1::2] - 0.5).astype(int)
+    keep = starts < ends
+    return rows[keep], starts[keep], ends[keep]
+
+
+def wkb_parts(wkb):
+    """Return x, y coordinates (N, 2 arrays) of all linestrings and
+    polygon rings of WKB (ISO or extended) geometry, read in bulk."""
+    parts = []
+    read_wkb(memoryview(wkb), 0, parts)
+    return parts
+
+
+def wkb_polygons(wkb):
+    """Return polygons of WKB (multi)polygon geometry, each given
+    as list of its rings (N, 2 arrays)."""
+    buffer = memoryview(wkb)
+    uint, _, geom_type, _, offset = wkb_header(buffer, 0)
+    if geom_type == 3:
+        return [wkb_parts(wkb)]
+    polygons = []
+    count = int(np.frombuffer(buffer, uint, 1, offset)[0])
+    offset += 4
+    for _ in range(count):
+        rings = []
+        offset = read_wkb(buffer, offset, rings)
+        if rings:
+            polygons.append(rings)
+    return polygons
+
+
+def wkb_header(buffer, offset):
+    order = '<' if buffer[offset] == 1 else '>'
+    uint = np.dtype(order + 'u4')
+    double = np.dtype(order + 'f8')
+    geom_type = int(np.frombuffer(buffer, uint, 1, offset + 1)[0])
+
+    offset += 5
+    dims = 2
+    if geom_type & 0x80000000:
+        dims += 1
+    if geom_type & 0x40000000:
+        dims += 1
+    if geom_type & 0x20000000:
+        offset += 4  # SRID of extended WKB
+    geom_type &= 0x0FFFFFFF
+    dims += {1: 1, 2: 1, 3: 2}.get(geom_type // 1000, 0)
+    return uint, double, geom_type % 1000, dims, offset
+
+
+def read_wkb(buffer, offset, parts):
+    uint, double, geom_type, dims, offset = wkb_header(buffer, offset)
+
+    def read_points(offset):
+        count = int(np.frombuffer(buffer, uint, 1, offset)[0])
+        offset += 4
+        coords = np.frombuffer(buffer, double, count * dims, offset).reshape(count, dims)
+        parts.append(coords[:, :2].astype(float))
+        return offset + count * dims * 8
+
+    if geom_type == 1:
+        return offset + dims * 8
+    if geom_type == 2:
+        return read_points(offset)
+    count = int(np.frombuffer(buffer, uint, 1, offset)[0])
+    offset += 4
+    for _ in range(count):
+        offset = read_points(offset) if geom_type == 3 else read_wkb(buffer, offset, parts)
+    return offset
@@ -0,0 +1,27 @@
+def flight_parameters(camera, gsd, p, q):
+    """Return base along (Bx) and across (By) track and ground lengths
+    of photo along and across track for GSD [m] and overlaps p, q [0-1]."""
+    len_along = camera.pixels_along_track * gsd
+    len_across = camera.pixels_across_track * gsd
+    Bx = len_along * (1 - p)
+    By = len_across * (1 - q)
+    return Bx, By, len_along, len_across
+
+
+def altitude_from_gsd(camera, gsd):
+    """Return altitude AGL [m] giving GSD [m] with the camera."""
+    return gsd / camera.sensor_size * camera.focal_length
+
+
+def block_direction(direction):
+    """Return angle [deg] of flight used in planning
+    for flight direction [deg] measured from north."""
+    angle = 90 - direction
+    if angle < 0:
+        angle += 360
+    return angle
+
+
+def gsd_from_altitude(camera, altitude_AGL):
+    """Return GSD [m] of the camera at altitude AGL [m]."""
+    return altitude_AGL * camera.sensor_size / camera.focal_length
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+class PlanResult():
+    """Columnar result of flight planning, one row per photo
+    in the order the photos were generated."""
+
+    def __init__(self, strip, photo, x, y, z, kappa, corners_x, corners_y,
+                 agl=None, segment=None) -> None:
+        self.strip = np.asarray(strip, dtype=int)
+        self.photo = np.asarray(photo, dtype=int)
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.z = np.asarray(z, dtype=float)
+        self.kappa = np.asarray(kappa, dtype=float)
+        self.corners_x = np.asarray(corners_x, dtype=float).reshape(-1, 4)
+        self.corners_y = np.asarray(corners_y, dtype=float).reshape(-1, 4)
+        size = len(self.strip)
+        self.agl = np.full(size, np.nan) if agl is None else np.asarray(agl, dtype=float)
+        self.segment = np.zeros(size, dtype=int) if segment is None else np.asarray(segment, dtype=int)
+
+    def __len__(self):
+        return len(self.strip)
+
+    def copy(self):
+        """Return plan result with copies of all columns."""
+        return PlanResult(**{name: column.copy() for name, column in vars(self).items()})
+
+    @staticmethod
+    def concatenate(results):
+        """Return one plan result made of the given results."""
+        return PlanResult(
+            np.concatenate([r.strip for r in results]),
+            np.concatenate([r.photo for r in results]),
+            np.concatenate([r.x for r in results]),
+            np.concatenate([r.y for r in results]),
+            np.concatenate([r.z for r in results]),
+            np.concatenate([r.kappa for r in results]),
+            np.concatenate([r.corners_x for r in results]),
+            np.concatenate([r.corners_y for r in results]),
+            np.concatenate([r.agl for r in results]),
+            np.concatenate([r.segment for r in results])
+        )
+
+    @staticmethod
+    def chain(results):
+        """Return one plan result of the given results numbered one after
+        another, with segment numbers telling where each row came from.
+        The given results are left unchanged."""
+        chained = PlanResult.concatenate(results)
+        strip_nr = photo_nr = 0
+        for segment_nr, r in enumerate(results, 1):
+            rows = slice(photo_nr, photo_nr + len(r))
+            chained.segment[rows] = segment_nr
+            chained.strip[rows] += strip_nr
+            chained.photo[rows] += photo_nr
+            strip_nr = chained.strip[rows].max(initial=strip_nr)
+            photo_nr += len(r)
+        return chained
+
+    def strip_groups(self):
+        """Yield strip number and row indexes of its photos
+        ordered by photo number, strip after strip."""
+        if len(self) == 0:
+            return
+        order = np.lexsort((self.photo, self.strip))
+        strips = self.strip[order]
+        bounds = np.flatnonzero(np.r_[True, strips[1:] != strips[:-1], True])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield int(strips[start]), order[start:end]
+
+    def strip_ends(self):
+        """Return row indexes of the first and last photo of every strip."""
+        ends = [(rows[0], rows[-1]) for _, rows in self.strip_groups()]
+        return np.array(ends, dtype=int).reshape(-1)
@@ -0,0 +1,216 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from math import atan, ceil, pi, sqrt
+from ..mathgeo_utils.coordinates import transf_coord, transformer
+
+
+def simplify_profile(vertices, epsilon):
+    """Return sorted indices of vertices (N, 3 array) kept after reducing
+    the number of vertices in the line, keeping its main shape.
+    It is based on the Douglas-Peucker simplification algorithm but
+    with the vertical distance instead of perpendicular.
+    """
+    vertices = np.asarray(vertices, dtype=float)
+    last = len(vertices) - 1
+    if last < 1:
+        return np.arange(len(vertices))
+
+    kept = [0, last]
+    spans = [(0, last)]
+    while spans:
+        first, end = spans.pop()
+        if end - first < 2:
+            continue
+        x1, y1, z1 = vertices[first]
+        x2, y2, z2 = vertices[end]
+        inner = vertices[first + 1:end]
+        if x1 != x2:
+            t = (inner[:, 0] - x1) / (x2 - x1)
+        else:
+            t = (inner[:, 1] - y1) / (y2 - y1)
+        h = np.abs(t * (z2 - z1) + z1 - inner[:, 2])
+        h[np.isnan(h)] = 0.0
+        index = int(np.argmax(h))
+        if h[index] > 0.0 and h[index] >= epsilon:
+            index += first + 1
+            kept.append(index)
+            spans.append((index, end))
+            spans.append((first, index))
+    return np.sort(kept)
+
+
+def distance2d(a, b):
+    """Calculate distance between 2 points"""
+    return sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2)
+
+
+def pixel_size(geotransf, transf_rst_vct=None):
+    """Return width, height and diagonal angle [deg] of raster pixel
+    in vector CRS units."""
+    pix_width = geotransf[1]
+    pix_height = -geotransf[5]
+
+    if transf_rst_vct is not None:
+        uplx = geotransf[0]
+        uply = geotransf[3]
+        uplx_n = uplx + pix_width
+        uply_n = uply + pix_height
+
+        xo, yo = transf_coord(transf_rst_vct, uplx, uply)
+        xo1, yo1 = transf_coord(transf_rst_vct, uplx_n, uply_n)
+
+        pix_width = distance2d((xo, yo), (xo1, yo))
+        pix_height = distance2d((xo, yo), (xo, yo1))
+
+    diagonal_angle = atan(pix_height / pix_width) * 180 / pi
+    return pix_width, pix_height, diagonal_angle
+
+
+def strip_profiles(plan, pix_width, pix_height, diagonal_angle):
+    """Return x, y of terrain profile vertices of all strips of the plan
+    as one ragged array and offsets (strips count + 1) slicing out profile
+    of every strip, in strip_groups order. Vertices run from the first to
+    the last projection centre of a strip, spaced by the pixel size
+    along its direction."""
+    ends = plan.strip_ends().reshape((-1, 2))
+    first_x, first_y = plan.x[ends[:, 0]], plan.y[ends[:, 0]]
+    last_x, last_y = plan.x[ends[:, 1]], plan.y[ends[:, 1]]
+    dx, dy = last_x - first_x, last_y - first_y
+
+    with np.errstate(divide='ignore'):
+        direction = np.where(dx != 0, np.abs(np.arctan(dy / np.where(dx != 0, dx, 1))), pi / 2)
+        step_profile = np.where(direction < np.radians(diagonal_angle),
+                                pix_width / np.cos(direction), pix_height / np.sin(direction))
+    counts = np.maximum(np.ceil(np.hypot(dx, dy) / step_profile).astype(int), 1)
+    offsets = np.r_[0, np.cumsum(counts)]
+
+    strip = np.repeat(np.arange(len(counts)), counts)
+    t = (np.arange(offsets[-1]) - offsets[strip]) / np.maximum(counts - 1, 1)[strip]
+    profile_x = first_x[strip] + t * dx[strip]
+    profile_y = first_y[strip] + t * dy[strip]
+    last = offsets[1:][counts > 1] - 1
+    profile_x[last], profile_y[last] = last_x[counts > 1], last_y[counts > 1]
+    return profile_x, profile_y, offsets
+
+
+def follow_terrain(pc_coords, simplified_profile, altitude_AGL):
+    """Return waypoints (x, y, altitude ASL) of flight following
+    the simplified terrain profile and altitudes ASL of projection
+    centres interpolated at their distances along the profile
+    (NaN for centres beyond its ends)."""
+    waypoints_coords = np.array(simplified_profile, dtype=float).reshape((-1, 3))
+    waypoints_coords[:, 2] += altitude_AGL
+
+    start, end = waypoints_coords[0, :2], waypoints_coords[-1, :2]
+    length = np.hypot(*(end - start))
+    direction = (end - start) / length if length else np.zeros(2)
+    waypoints_dist = (waypoints_coords[:, :2] - start) @ direction
+    pc_dist = (np.asarray(pc_coords, dtype=float) - start) @ direction
+    pc_ASL = np.interp(pc_dist, waypoints_dist, waypoints_coords[:, 2], left=np.nan, right=np.nan)
+    return waypoints_coords, pc_ASL
+
+
+def envelope_heights(dtm, x, y, angle, width, spacing, transf_vct_rst=None,
+                     method='bilinear', rows_chunk=256):
+    """Return heights of the highest terrain across track within half of
+    width on both sides of points x, y of strips running in direction
+    angle [rad]. The DTM is resampled once on a grid spaced by spacing in
+    the strip frame covering all points, max-filtered across track with
+    maximum_filter1d and sampled at the points by method, band after band
+    of grid rows along track. Requires SciPy."""
+    from scipy import ndimage
+    cos_a, sin_a = np.cos(angle), np.sin(angle)
+    u = x * cos_a + y * sin_a
+    v = y * cos_a - x * sin_a
+    half = ceil(width / 2 / spacing)
+    u0, v0 = u.min(), v.min() - half * spacing
+    rows = int(np.floor((u.max() - u0) / spacing)) + 2
+    cols = int(np.floor((v.max() - v.min()) / spacing)) + 2 * half + 2
+    grid_v = v0 + np.arange(cols) * spacing
+    point_r, point_c = (u - u0) / spacing, (v - v0) / spacing
+    point_band = np.floor(point_r).astype(int) // rows_chunk
+
+    heights = np.full(len(x), np.nan)
+    for band in np.unique(point_band):
+        start = band * rows_chunk
+        grid_u = u0 + np.arange(start, min(start + rows_chunk + 1, rows)) * spacing
+        grid_x = (grid_u[:, None] * cos_a - grid_v * sin_a).ravel()
+        grid_y = (grid_u[:, None] * sin_a + grid_v * cos_a).ravel()
+        if transf_vct_rst is not None:
+            grid_x, grid_y = transf_vct_rst.transform(grid_x, grid_y)
+        surface = dtm.sample(grid_x, grid_y, method=method).reshape((len(grid_u), cols))
+        surface[np.isnan(surface)] = -np.inf
+        surface = ndimage.maximum_filter1d(surface, 2 * half + 1, axis=1, mode='constant', cval=-np.inf)
+        surface[np.isinf(surface)] = np.nan
+        points = point_band == band
+        heights[points] = ndimage.map_coordinates(
+            surface, (point_r[points] - start, point_c[points]),
+            order=1 if method == 'bilinear' else 0, mode='nearest')
+    return heights
+
+
+def strip_directions(profile_x, profile_y, offsets):
+    """Return direction [rad, 0..pi) of every strip profile
+    rounded so that parallel strips share it."""
+    first, last = offsets[:-1], offsets[1:] - 1
+    angle = np.mod(np.arctan2(profile_y[last] - profile_y[first], profile_x[last] - profile_x[first]), pi)
+    angle = np.round(angle, 6)
+    return np.where(angle >= round(pi, 6), 0.0, angle)
+
+
+def follow_terrain_strips(plan, dtm, altitude_AGL, tolerance, crs_vct=None, crs_rst=None,
+                          max_workers=None, method='bilinear', envelope_width=None, cancelled=None):
+    """Yield rows, waypoints (x, y, altitude ASL), altitudes ASL of projection
+    centres and terrain heights under them for every strip of the plan in
+    strip order. Profiles of all strips and projection centres are sampled
+    from the DTM store by method ('nearest' or 'bilinear') in one pass, then
+    strips are simplified concurrently in threads. With envelope_width
+    (across track, e.g. photo width on the ground) profiles follow the
+    highest terrain across the swath, sampled from the DTM max-filtered
+    across track once for every direction of strips. Pending strips are
+    cancelled when the generator is closed or, from any thread, when the
+    cancelled event (threading.Event) is set, which also ends the generator."""
+    transf_vct_rst = transf_rst_vct = None
+    if crs_vct is not None and crs_rst is not None and crs_vct != crs_rst:
+        transf_vct_rst = transformer(crs_vct, crs_rst)
+        transf_rst_vct = transformer(crs_rst, crs_vct)
+    pix_width, pix_height, diagonal_angle = pixel_size(dtm.geotransf, transf_rst_vct)
+
+    profile_x, profile_y, offsets = strip_profiles(plan, pix_width, pix_height, diagonal_angle)
+    if envelope_width:
+        x, y = plan.x, plan.y
+    else:
+        x, y = np.r_[profile_x, plan.x], np.r_[profile_y, plan.y]
+    if transf_vct_rst is not None:
+        x, y = transf_vct_rst.transform(x, y)
+    heights = dtm.sample(x, y, method=method)
+    profile_z, terrain_z = heights[:len(x) - len(plan.x)], heights[len(x) - len(plan.x):]
+    if envelope_width:
+        profile_z = np.empty(len(profile_x))
+        directions = np.repeat(strip_directions(profile_x, profile_y, offsets), np.diff(offsets))
+        for angle in np.unique(directions):
+            vertices = directions == angle
+            profile_z[vertices] = envelope_heights(
+                dtm, profile_x[vertices], profile_y[vertices], angle, envelope_width,
+                min(pix_width, pix_height), transf_vct_rst, method)
+
+    def strip(k, rows):
+        if cancelled is not None and cancelled.is_set():
+            return None
+        vertices = slice(offsets[k], offsets[k + 1])
+        profile = np.column_stack((profile_x[vertices], profile_y[vertices], profile_z[vertices]))
+        pc_coords = np.column_stack((plan.x[rows], plan.y[rows]))
+        waypoints_coords, pc_ASL = follow_terrain(
+            pc_coords, profile[simplify_profile(profile, tolerance)], altitude_AGL)
+        return rows, waypoints_coords, pc_ASL, terrain_z[rows]
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(strip, k, rows) for k, (_, rows) in enumerate(plan.strip_groups())]
+        for future in futures:
+            result = future.result()
+            if result is None or (cancelled is not None and cancelled.is_set()):
+                return
+            yield result
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,16 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(ROOT))
+
+
+@pytest.fixture
+def plugin():
+    """Return function importing module of the plugin package by its
+    name relative to the package, whatever the plugin folder is called."""
+    package = os.path.basename(ROOT)
+    return lambda name: importlib.import_module(f"{package}.{name}")
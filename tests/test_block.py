@@ -0,0 +1,111 @@
+from math import atan2, cos, fabs, pi, radians, sin, sqrt
+
+import numpy as np
+import pytest
+
+BX, BY, LX, LY, X, M, H = 40.0, 90.0, 100.0, 150.0, 25.0, 2, 500.0
+
+RECTANGLE = [(0, 0), (610, 0), (610, 415), (0, 415)]
+CONCAVE = [(0, 0), (715, 0), (715, 505), (450, 505), (450, 150), (250, 150), (250, 505), (0, 505)]
+OUTER = [(0, 0), (815, 0), (815, 610), (0, 610)]
+HOLE = [(200, 200), (200, 400), (600, 400), (600, 200)]
+LEFT = [(0, 0), (300, 0), (300, 505), (0, 505)]
+RIGHT = [(400, 50), (715, 50), (715, 455), (400, 455)]
+
+# sizes are not multiples of the bases and the gap between the parts is
+# narrower than a strip, since the baseline failed on empty rows
+RANGES = {
+    'rectangle': [[RECTANGLE]],
+    'concave': [[CONCAVE]],
+    'with hole': [[OUTER, HOLE]],
+    'multi-part': [[LEFT], [RIGHT]],
+}
+
+
+def closed(ring):
+    return np.array(ring + ring[:1], dtype=float)
+
+
+def baseline_centres(block, alpha, polygons, box):
+    """Return kept projection centres (x, y, strip, photo in generation
+    order) of the range as computed by the baseline plugin: GEOS distance
+    between the central line of every candidate photo and its strip clipped
+    to the range, strips counted at gaps and odd rows renumbered backwards.
+    Offsets of the candidates are computed by the unchanged calculate_offsets."""
+    shapely = pytest.importorskip('shapely')
+    geometry = shapely.MultiPolygon([shapely.Polygon(rings[0], rings[1:]) for rings in polygons])
+    a, b, a2, b2, Dx, Dy = box
+    Nx, Ny, x0, y0, dx, dy, dx0, dy0 = block.calculate_offsets(alpha, a, b, a2, b2, Dx, Dy, BX, BY, LY, M, X)
+    d = sqrt((LX / 2) ** 2 + (LY / 2) ** 2)
+    theta = fabs(atan2(LY / 2, LX / 2))
+    a_r = radians(alpha)
+
+    centres, strip_nr, photo_nr = [], 0, 0
+    for k in range(Ny):
+        strip = shapely.Polygon([
+            (x0 - M * dx + cos(a_r + theta - pi) * d, y0 - M * dy + sin(a_r + theta - pi) * d),
+            (x0 - M * dx + cos(a_r - theta + pi) * d, y0 - M * dy + sin(a_r - theta + pi) * d),
+            (x0 + (Nx - M - 1) * dx + cos(a_r + theta) * d, y0 + (Nx - M - 1) * dy + sin(a_r + theta) * d),
+            (x0 + (Nx - M - 1) * dx + cos(a_r - theta) * d, y0 + (Nx - M - 1) * dy + sin(a_r - theta) * d),
+        ]).intersection(geometry)
+        # the baseline started with n_prev = -M - 1, so a row whose first photo
+        # was candidate -M continued the previous strip and failed to renumber
+        row, n_prev = [], None
+        for n in range(-M, Nx - M):
+            xi, yi = x0 + n * dx, y0 + n * dy
+            central_line = shapely.LineString([
+                (xi + cos(a_r + pi / 2) * LY / 2, yi + sin(a_r + pi / 2) * LY / 2),
+                (xi + cos(a_r - pi / 2) * LY / 2, yi + sin(a_r - pi / 2) * LY / 2)])
+            if central_line.distance(strip) <= M * BX:
+                photo_nr += 1
+                if n_prev is None or fabs(n - n_prev) != 1:
+                    strip_nr += 1
+                row.append([xi, yi, strip_nr, photo_nr])
+                n_prev = n
+        if k % 2 == 0:
+            first_p, first_s = photo_nr + 1, strip_nr + 1
+        else:
+            list_p = list(range(first_p, photo_nr + 1))
+            list_s = list(range(first_s, strip_nr + 1))
+            i, j, s_prev = len(list_p) - 1, len(list_s) - 1, list_s[0]
+            for centre in row:
+                if centre[2] != s_prev:
+                    j -= 1
+                s_prev = centre[2]
+                centre[2:] = list_s[j], list_p[i]
+                i -= 1
+        centres.extend(row)
+        x0 += dx0
+        y0 += dy0
+    return np.array(centres).reshape((-1, 4))
+
+
+@pytest.fixture
+def block(plugin):
+    return plugin('planning.block')
+
+
+@pytest.mark.parametrize('name', RANGES)
+@pytest.mark.parametrize('direction', [0.0, 30.0, 90.0, 135.0, 250.0])
+def test_projection_centres_match_baseline(plugin, block, name, direction):
+    algebra = plugin('mathgeo_utils.algebra')
+    alpha = plugin('planning.parameters').block_direction(direction)
+    polygons = [[closed(ring) for ring in rings] for rings in RANGES[name]]
+    rings = [ring for polygon in polygons for ring in polygon]
+    box = algebra.bounding_box_at_angle(alpha, np.vstack(rings))
+
+    plan = block.projection_centres(alpha, rings, *box, BX, BY, LX, LY, X, M, H)
+    expected = baseline_centres(block, alpha, RANGES[name], box)
+
+    assert len(plan) == len(expected) > 0
+    np.testing.assert_allclose(np.column_stack((plan.x, plan.y)), expected[:, :2])
+    np.testing.assert_array_equal(plan.strip, expected[:, 2])
+    np.testing.assert_array_equal(plan.photo, expected[:, 3])
+
+
+def test_serpentine_numbering_reverses_odd_rows(block):
+    k = np.array([0, 0, 0, 0, 1, 1, 1, 1, 2, 2])
+    n = np.array([0, 1, 3, 4, 0, 1, 2, 5, 1, 2])
+    strips, photos = block.serpentine_numbering(k, n, 10, 100)
+    np.testing.assert_array_equal(strips, [11, 11, 12, 12, 14, 14, 14, 13, 15, 15])
+    np.testing.assert_array_equal(photos, [101, 102, 103, 104, 108, 107, 106, 105, 109, 110])
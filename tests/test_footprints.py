@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class WindowDTM:
+    """DTM with heights held in memory, read like DTM store."""
+
+    def __init__(self, heights, geotransf):
+        self.heights = heights
+        self.geotransf = geotransf
+        self.height, self.width = heights.shape
+
+    def read(self, col, row, width, height):
+        window = np.full((height, width), np.nan)
+        r0, r1 = max(row, 0), min(row + height, self.height)
+        c0, c1 = max(col, 0), min(col + width, self.width)
+        window[r0 - row:r1 - row, c0 - col:c1 - col] = self.heights[r0:r1, c0:c1]
+        return window
+
+
+def terrain(nodata=()):
+    rows, cols = np.mgrid[0:200, 0:200]
+    heights = 100 + 0.1 * rows + 0.05 * cols
+    for r, c in nodata:
+        heights[r, c] = np.nan
+    return WindowDTM(heights, (0.0, 1.0, 0.0, 200.0, 0.0, -1.0))
+
+
+def footprint(plugin, dtm, Xs, Ys):
+    utils = plugin('ui.quality_control.modules.footprints.utils')
+    camera = plugin('camera.models').Camera('test', 0.1, 0.00001, 2000, 1000)
+    R = np.eye(3)
+    Zs, Z_min = 400.0, 100.0
+    clipped, geot = utils.clip_raster(dtm, camera.image_corners(), R, Xs, Ys, Zs, Z_min,
+                                      None, 'EPSG:2180', 'EPSG:2180')
+    xyf = utils.image_edge_points(camera, Z_min, Zs, 1.0)
+    return clipped, utils.ground_edge_points(R, Z_min, 0.01, xyf, Xs, Ys, Zs, clipped, geot,
+                                             'EPSG:2180', 'EPSG:2180', None)
+
+
+def test_nodata_pixel_in_photo_window(plugin):
+    clipped, vertices = footprint(plugin, terrain(nodata=[(100, 100), (95, 110)]), 100.0, 100.0)
+    assert np.isfinite(clipped).all()
+    assert np.isfinite(vertices).all()
+
+
+def test_photo_window_past_dtm_edge(plugin):
+    clipped, vertices = footprint(plugin, terrain(), 195.0, 5.0)
+    assert np.isfinite(clipped).all()
+    assert np.isfinite(vertices).all()
+
+
+def test_fill_nodata_takes_nearest_valid_height(plugin):
+    utils = plugin('ui.quality_control.modules.footprints.utils')
+    heights = np.array([[1.0, np.nan, np.nan, 4.0]])
+    assert utils.fill_nodata(heights, 0.0).tolist() == [[1.0, 1.0, 4.0, 4.0]]
+    assert utils.fill_nodata(np.full((2, 2), np.nan), 7.0).tolist() == [[7.0, 7.0], [7.0, 7.0]]
@@ -0,0 +1,35 @@
+import struct
+
+import numpy as np
+
+
+def polygon_wkb(ring, geom_type=3, srid=None, order='<'):
+    """Return WKB of polygon with one ring (N, 2 array), with SRID
+    written after the type as in extended WKB."""
+    if srid is not None:
+        geom_type |= 0x20000000
+    wkb = struct.pack(order + 'BI', 1 if order == '<' else 0, geom_type)
+    if srid is not None:
+        wkb += struct.pack(order + 'I', srid)
+    wkb += struct.pack(order + 'II', 1, len(ring))
+    return wkb + np.asarray(ring, dtype=order + 'f8').tobytes()
+
+
+RING = np.array([[0.0, 0.0], [10.0, 0.0], [10.0, 5.0], [0.0, 0.0]])
+
+
+def test_wkb_parts_skips_srid_of_extended_wkb(plugin):
+    geometry = plugin('planning.geometry')
+    for order in '<>':
+        parts = geometry.wkb_parts(polygon_wkb(RING, srid=2180, order=order))
+        assert len(parts) == 1
+        np.testing.assert_array_equal(parts[0], RING)
+
+
+def test_wkb_polygons_of_extended_multipolygon(plugin):
+    geometry = plugin('planning.geometry')
+    part = polygon_wkb(RING)
+    wkb = struct.pack('<BIII', 1, 6 | 0x20000000, 2180, 2) + part + part
+    polygons = geometry.wkb_polygons(wkb)
+    assert len(polygons) == 2
+    np.testing.assert_array_equal(polygons[1][0], RING)
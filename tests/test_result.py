@@ -0,0 +1,27 @@
+import numpy as np
+
+
+def plan(plugin, strips):
+    PlanResult = plugin('planning.result').PlanResult
+    size = len(strips)
+    return PlanResult(strips, np.arange(1, size + 1), np.zeros(size), np.zeros(size),
+                      np.zeros(size), np.zeros(size), np.zeros((size, 4)), np.zeros((size, 4)))
+
+
+def test_chain_numbers_results_one_after_another(plugin):
+    PlanResult = plugin('planning.result').PlanResult
+    chained = PlanResult.chain([plan(plugin, [1, 1, 2]), plan(plugin, []), plan(plugin, [1, 2, 2])])
+    np.testing.assert_array_equal(chained.strip, [1, 1, 2, 3, 4, 4])
+    np.testing.assert_array_equal(chained.photo, [1, 2, 3, 4, 5, 6])
+    np.testing.assert_array_equal(chained.segment, [1, 1, 1, 3, 3, 3])
+
+
+def test_chain_leaves_results_unchanged(plugin):
+    PlanResult = plugin('planning.result').PlanResult
+    results = [plan(plugin, [1, 2]), plan(plugin, [1, 2])]
+    PlanResult.chain(results)
+    PlanResult.chain(results)
+    for r in results:
+        np.testing.assert_array_equal(r.strip, [1, 2])
+        np.testing.assert_array_equal(r.photo, [1, 2])
+        np.testing.assert_array_equal(r.segment, [0, 0])
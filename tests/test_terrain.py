@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+
+class GridDTM:
+    """DTM with heights held in memory and pixels of 1 m from (0, 0),
+    sampled like DTM store."""
+
+    def __init__(self, heights):
+        self.heights = heights
+        self.geotransf = (0.0, 1.0, 0.0, float(heights.shape[0]), 0.0, -1.0)
+
+    def sample(self, x, y, method='bilinear'):
+        from scipy import ndimage
+        rows = self.heights.shape[0] - np.asarray(y, dtype=float) - 0.5
+        cols = np.asarray(x, dtype=float) - 0.5
+        return ndimage.map_coordinates(self.heights, (rows, cols), order=1 if method == 'bilinear' else 0,
+                                       mode='constant', cval=np.nan)
+
+
+def hills(size=400, seed=1):
+    rows, cols = np.mgrid[0:size, 0:size]
+    rng = np.random.default_rng(seed)
+    heights = np.full((size, size), 100.0)
+    for r, c, h in rng.uniform((0, 0, 10), (size, size, 80), (30, 3)):
+        heights += h * np.exp(-((rows - r) ** 2 + (cols - c) ** 2) / 200)
+    return heights
+
+
+@pytest.mark.parametrize('angle', [0.0, 0.4, np.pi / 2, 2.5])
+def test_envelope_heights_is_max_across_track(plugin, angle):
+    pytest.importorskip('scipy')
+    terrain = plugin('planning.terrain')
+    dtm = GridDTM(hills())
+    t = np.linspace(-100, 100, 201)
+    x, y = 200 + t * np.cos(angle), 200 + t * np.sin(angle)
+    envelope = terrain.envelope_heights(dtm, x, y, angle, 60, 1.0, rows_chunk=50)
+
+    offsets = np.linspace(-30, 30, 61)[:, None]
+    across = dtm.sample(x - offsets * np.sin(angle), y + offsets * np.cos(angle)).max(axis=0)
+    np.testing.assert_allclose(envelope, across, atol=1e-9)
+    assert np.all(envelope >= dtm.sample(x, y) - 1e-9)
+
+
+def baseline_simplify_profile(vertices, epsilon):
+    """Recursive simplification of the baseline plugin, returning vertices."""
+    def z_at_3d_line(pnt, start_pnt, end_pnt):
+        x1, y1, z1 = start_pnt
+        x2, y2, z2 = end_pnt
+        x, y = pnt[:2]
+        if x1 != x2:
+            t = (x - x1) / (x2 - x1)
+        else:
+            t = (y - y1) / (y2 - y1)
+        return t * (z2 - z1) + z1
+
+    hmax = 0.0
+    index = 0
+    for i in range(1, len(vertices) - 1):
+        h = abs(z_at_3d_line(vertices[i], vertices[0], vertices[-1]) - vertices[i][2])
+        if h > hmax:
+            index = i
+            hmax = h
+    if hmax >= epsilon:
+        return baseline_simplify_profile(vertices[:index + 1], epsilon)[:-1] \
+            + baseline_simplify_profile(vertices[index:], epsilon)
+    return [vertices[0], vertices[-1]]
+
+
+def profile(angle, size=300, nans=(), seed=2):
+    rng = np.random.default_rng(seed)
+    t = np.cumsum(rng.uniform(0.5, 2.0, size))
+    z = 200 + np.cumsum(rng.normal(0, 3, size))
+    z[list(nans)] = np.nan
+    return np.column_stack((100 + t * np.cos(angle), 50 + t * np.sin(angle), z))
+
+
+@pytest.mark.parametrize('angle', [0.3, np.pi / 2, 3.0])
+@pytest.mark.parametrize('nans', [(), (5, 6, 7, 150, 151), (0, 120), (299,)], ids=['none', 'inner', 'first', 'last'])
+@pytest.mark.parametrize('epsilon', [0.5, 5.0, 40.0])
+def test_simplify_profile_matches_baseline(plugin, angle, nans, epsilon):
+    terrain = plugin('planning.terrain')
+    vertices = profile(angle, nans=nans)
+    expected = baseline_simplify_profile(list(vertices), epsilon)
+
+    indices = terrain.simplify_profile(vertices, epsilon)
+    assert indices[0] == 0 and indices[-1] == len(vertices) - 1
+    np.testing.assert_array_equal(vertices[indices], np.array(expected))
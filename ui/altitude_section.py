@@ -131,6 +131,7 @@ class AltitudeSectionHandler:
 
         self.dialog.labelToleranceWaypoints.setEnabled(text == 'Terrain Following')
         self.dialog.doubleSpinBoxTolerance.setEnabled(text == 'Terrain Following')
+        self.dialog.checkBoxSwathEnvelope.setEnabled(text == 'Terrain Following')
         self.dialog.radioButtonAltAGL.setEnabled(text == 'Terrain Following')
         if text != 'Terrain Following':
             self.dialog.radioButtonGSD.setChecked(True)
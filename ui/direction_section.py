@@ -1,8 +1,14 @@
+from ..planning.direction import CRITERIA, best_direction, direction_costs
+
+
 class DirectionSectionHandler:
     """Handler for synchronizing a dial and spin box representing direction in degrees."""
-    def __init__(self, dial, spinBox):
+    def __init__(self, dial, spinBox, comboBoxCriterion):
         self.dial = dial
         self.spinBox = spinBox
+        self.comboBoxCriterion = comboBoxCriterion
+        for criterion in CRITERIA:
+            self.comboBoxCriterion.addItem(f"Fewest {criterion}", criterion)
         self.dial.valueChanged.connect(self.on_dial_valueChanged)
         self.spinBox.valueChanged.connect(self.on_spinBoxDirection_valueChanged)
 
@@ -14,4 +20,12 @@ class DirectionSectionHandler:
     def on_spinBoxDirection_valueChanged(self):
         """Handle changes in the spin box and update the dial"""
         v = self.spinBox.value()
-        self.dial.setValue(v - 180 if v > 180 else v + 180)
\ No newline at end of file
+        self.dial.setValue(v - 180 if v > 180 else v + 180)
+
+    def optimize(self, vertices, Bx, By, Ly, x, m):
+        """Set the direction of the lowest cost by the chosen criterion
+        and return sorted cost table"""
+        criterion = self.comboBoxCriterion.currentData()
+        direction, ranked = best_direction(direction_costs(vertices, Bx, By, Ly, x, m), criterion)
+        self.spinBox.setValue(int(direction))
+        return ranked
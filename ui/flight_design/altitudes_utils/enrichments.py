@@ -1,30 +1,15 @@
-from qgis.core import QgsPointXY
-from pyproj import Transformer
+from ....mathgeo_utils.coordinates import transformer
+from ....planning.altitudes import terrain_agl
+from ....planning.dtm import open_dtm
 
-def enrich_projection_centres_with_agl(ui, pc_lay):
-    """Enrich projection centres layer with altitude AGL"""
+def enrich_projection_centres_with_agl(ui, plan):
+    """Enrich projection centres of the plan with altitude AGL"""
     if not hasattr(ui, 'DTM'):
         return
 
+    transf_vct_rst = None
     if ui.crs_rst != ui.crs_vct:
-        crs_from = ui.crs_vct.authid()
-        crs_to = ui.crs_rst.authid()
+        transf_vct_rst = transformer(ui.crs_vct, ui.crs_rst)
 
-        if not crs_to:
-            crs_to = ui.crs_rst.toWkt()
-        
-        transf_vct_rst = Transformer.from_crs(crs_from, crs_to, always_xy=True)
-
-    feats = pc_lay.getFeatures()
-    pc_lay.startEditing()
-    for f in feats:
-        x, y = f.geometry().asPoint().x(), f.geometry().asPoint().y()
-        if ui.crs_rst != ui.crs_vct:
-            x, y = transf_vct_rst.transform(x, y)
-
-        altitude_ASL_f = f.attribute('Alt. ASL [m]')
-        terrain_height, _ = ui.DTM.dataProvider().sample(QgsPointXY(x, y), 1)
-        altitude_AGL_f = altitude_ASL_f - terrain_height
-        pc_lay.changeAttributeValue(f.id(), 5, round(altitude_AGL_f, 2))
-    pc_lay.commitChanges()
-    ui.progressBar.setValue(70)
\ No newline at end of file
+    terrain_agl(plan, open_dtm(ui.DTM.source()).sample(plan.x, plan.y, transf_vct_rst))
+    ui.progressBar.setValue(70)
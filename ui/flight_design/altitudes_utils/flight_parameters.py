@@ -1,3 +1,5 @@
+from ....planning.parameters import flight_parameters
+
 def calculate_flight_parameters(ui):
     """Get and calculate flight parameters according to UI data"""
     gsd = ui.doubleSpinBoxGSD.value() / 100
@@ -7,10 +9,7 @@ def calculate_flight_parameters(ui):
         ui.p = ui.doubleSpinBoxOverlap.value() / 100
         ui.q = ui.doubleSpinBoxSidelap.value() / 100
 
-    len_along = camera.pixels_along_track * gsd
-    len_across = camera.pixels_across_track * gsd
-    Bx = len_along * (1 - ui.p)
-    By = len_across * (1 - ui.q)
+    Bx, By, len_along, len_across = flight_parameters(camera, gsd, ui.p, ui.q)
 
     ui.progressBar.setValue(30)
     return Bx, By, len_along, len_across
\ No newline at end of file
@@ -1,27 +1,39 @@
-from qgis.core import QgsCoordinateReferenceSystem, QgsProject, QgsRasterLayer
+from qgis.core import QgsCoordinateReferenceSystem, QgsProcessingUtils, QgsProject, QgsRasterLayer
 from ....error_reporting import QgsMessBox
-from ...terrain_utils import is_poligon_inside_raster
+from ...terrain_utils import dtm_window, is_poligon_inside_raster
+from ....geoprocessing_utils import geometry_parts
+from ....planning.cache import fingerprint, plan_cache, source_fingerprint
+from ....planning.dtm import warp_window
+from ....planning.parameters import flight_parameters
 from qgis.PyQt.QtWidgets import QApplication
 import processing
 
+def design_margin(ui):
+    """Return margin [m] around AoI or Corridor line covering photos
+    of extreme strips and buffer of corridor"""
+    _, _, len_along, len_across = flight_parameters(
+        ui.camera_handler.camera, ui.doubleSpinBoxGSD.value() / 100, 0, 0)
+    margin = (ui.spinBoxMultipleBase.value() + 1) * len_along + len_across
+    if ui.tabCorridor:
+        margin += ui.doubleSpinBoxBuffer.value()
+    return margin
+
 def initialize_crs_and_progressbar(ui):
     """Validate CRS of DTM and configure progress bar format"""
     target_crs = QgsCoordinateReferenceSystem(ui.epsg_code)
     
     if ui.DTM and ui.DTM.crs().isValid():
+        vlayer = ui.AreaOfInterest if ui.tabBlock else ui.CorLine
+        margin = design_margin(ui)
+        ui.DTM = dtm_window(ui.DTM, vlayer.crs(), vlayer.extent().buffered(margin))
         if ui.DTM.crs().authid() != ui.epsg_code:
             try:
-                res = processing.run("gdal:warpreproject", {
-                    'INPUT': ui.DTM,
-                    'SOURCE_CRS': ui.DTM.crs().authid(),
-                    'TARGET_CRS': ui.epsg_code,
-                    'RESAMPLING': 0,
-                    'NODATA': None,
-                    'OPTIONS': '',
-                    'DATA_TYPE': 0,
-                    'OUTPUT': 'TEMPORARY_OUTPUT'
-                })
-                ui.DTM = QgsRasterLayer(res['OUTPUT'], "Reprojected DTM Layer")
+                extent = vlayer.extent()
+                warped = warp_window(ui.DTM.source(), ui.epsg_code,
+                                     (extent.xMinimum(), extent.yMinimum(),
+                                      extent.xMaximum(), extent.yMaximum()),
+                                     margin, QgsProcessingUtils.tempFolder())
+                ui.DTM = QgsRasterLayer(warped, "Reprojected DTM Layer")
             except Exception as e:
                 QgsMessBox('Reprojection Error', f'Failed to reproject DTM: {str(e)}')
         
@@ -66,11 +78,15 @@ def initialize_design_environment(ui):
 
     initialize_crs_and_progressbar(ui)
 
+    if not ui.DTM:
+        return
+    vlayer = ui.AreaOfInterest if ui.tabBlock else ui.CorLine
     try:
-        if ui.tabBlock:
-            is_poligon_inside_raster(ui.AreaOfInterest, ui.DTM)
-        elif ui.tabCorridor:
-            is_poligon_inside_raster(ui.CorLine, ui.DTM)
+        key = fingerprint('dtm_check', source_fingerprint(ui.DTM.source()),
+                          [geometry_parts(f.geometry()) for f in vlayer.getFeatures()])
+        if key not in plan_cache:
+            is_poligon_inside_raster(vlayer, ui.DTM)
+            plan_cache.put(key, True)
     except Exception as e:
         ui.pushButtonRunDesign.setEnabled(True)
         ui.progressBar.setValue(0)
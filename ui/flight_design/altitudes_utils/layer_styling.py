@@ -1,10 +1,13 @@
 import os
 from ....geoprocessing_utils import add_to_canvas, create_waypoints, create_flight_line, change_layer_style
+from .projection_centres import plan_to_layers
 from qgis.core import QgsCoordinateReferenceSystem
 
-def prepare_and_style_layers(ui, pc_lay, photo_lay):
+def prepare_and_style_layers(ui, plan):
     """Prepare, set up and add layers to group"""
-    waypoints_layer = create_waypoints(pc_lay, ui.crs_vct)
+    pc_lay, photo_lay = plan_to_layers(plan, QgsCoordinateReferenceSystem(ui.epsg_code), ui.tabCorridor)
+
+    waypoints_layer = create_waypoints(plan, ui.crs_vct)
     waypoints_layer.setCrs(QgsCoordinateReferenceSystem(ui.epsg_code)) # Transform
 
     flight_line = create_flight_line(waypoints_layer, ui.crs_vct)
@@ -12,13 +15,6 @@ def prepare_and_style_layers(ui, pc_lay, photo_lay):
     
     style_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flight_line_style.qml')
     flight_line.loadNamedStyle(style_path)
-
-    pc_lay.startEditing()
-    pc_lay.deleteAttributes([9, 10, 11])
-    pc_lay.commitChanges()
-    photo_lay.startEditing()
-    photo_lay.deleteAttributes([2, 3])
-    photo_lay.commitChanges()
     ui.progressBar.setValue(80)
 
     change_layer_style(photo_lay, {'color': '200,200,200,30', 'color_border': '#000000', 'width_border': '0.2'})
@@ -29,4 +25,4 @@ def prepare_and_style_layers(ui, pc_lay, photo_lay):
 
     add_to_canvas([pc_lay, flight_line, waypoints_layer, photo_lay], "flight_design", ui.design_run_counter)
     ui.design_run_counter += 1
-    ui.progressBar.setValue(100)
\ No newline at end of file
+    ui.progressBar.setValue(100)
@@ -20,12 +20,12 @@ def run_design_one_altitude(ui):
         Bx, By, len_along, len_across = calculate_flight_parameters(ui)
 
         if ui.tabBlock:
-            pc_lay, photo_lay, _, _ = process_block_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
+            plan, _, _ = process_block_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
         elif ui.tabCorridor:
-            pc_lay, photo_lay, _, _, _ = process_corridor_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
+            plan, _, _, _ = process_corridor_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
 
-        enrich_projection_centres_with_agl(ui, pc_lay)
-        prepare_and_style_layers(ui, pc_lay, photo_lay)
+        enrich_projection_centres_with_agl(ui, plan)
+        prepare_and_style_layers(ui, plan)
 
     except Exception:
         ui.progressBar.setValue(0)
@@ -4,6 +4,8 @@ from ..altitudes_utils.initialization import initialize_design_environment
 from ..altitudes_utils.flight_parameters import calculate_flight_parameters
 from ..altitudes_utils.altitude_calculation import calculate_altitude
 from ..altitudes_utils.process_modes import process_block_mode, process_corridor_mode
+from ....planning.cache import fingerprint, source_fingerprint
+from ....planning.dtm import open_dtm
 
 def run_design_separate_altitude(ui):
     """RunDesign logic for 'Separate Altitude ASL for Each Strip'."""
@@ -18,27 +20,27 @@ def run_design_separate_altitude(ui):
         Bx, By, len_along, len_across = calculate_flight_parameters(ui)
 
         if ui.tabBlock:
-            pc_lay, photo_lay, theta, dist = process_block_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
+            plan, theta, dist = process_block_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
         elif ui.tabCorridor:
-            pc_lay, photo_lay, line_buf_list, theta, dist = process_corridor_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
+            plan, line_buf_list, theta, dist = process_corridor_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
 
         params = dict(
-            pointLayer=pc_lay,
-            polygonLayer=photo_lay,
+            plan=plan,
             DTM=ui.DTM,
+            dtmStore=open_dtm(ui.DTM.source()),
             altitude_AGL=altitude_AGL,
             crsVectorLayer=ui.crs_vct,
             crsRasterLayer=ui.crs_rst,
             tabWidg=ui.tabCorridor,
             theta=theta,
-            distance=dist
+            distance=dist,
+            extentsKey=fingerprint('strip_extents', ui.plan_key, source_fingerprint(ui.DTM.source()))
         )
 
         if ui.tabCorridor:
             params['LineRangeList'] = line_buf_list
         else:
-            ui.geom_AoI = ui.AreaOfInterest.getFeatures().__next__().geometry()
-            params['Range'] = ui.geom_AoI
+            params['Range'] = ui.aoi_geom
 
         ui.startWorker_updateAltitude(mode="separate", **params)
     except Exception:
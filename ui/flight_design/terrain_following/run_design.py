@@ -4,7 +4,7 @@ from ..altitudes_utils.initialization import initialize_design_environment
 from ..altitudes_utils.flight_parameters import calculate_flight_parameters
 from ..altitudes_utils.altitude_calculation import calculate_altitude
 from ..altitudes_utils.process_modes import process_block_mode, process_corridor_mode
-from osgeo import gdal
+from ....planning.dtm import open_dtm
 
 def run_design_terrain_following(ui):
     """RunDesign logic for 'Terrain Following'."""
@@ -19,27 +19,26 @@ def run_design_terrain_following(ui):
         Bx, By, len_along, len_across = calculate_flight_parameters(ui)
 
         if ui.tabBlock:
-            pc_lay, photo_lay, theta, dist = process_block_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
+            plan, theta, dist = process_block_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
         elif ui.tabCorridor:
-            pc_lay, photo_lay, line_buf_list, theta, dist = process_corridor_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
+            plan, line_buf_list, theta, dist = process_corridor_mode(ui, Bx, By, len_along, len_across, altitude_ASL)
         
-        dtm_raster = gdal.Open(ui.DTM.source())
         params = {
-            'pointLayer': pc_lay,
+            'plan': plan,
             'crsVectorLayer': ui.crs_vct,
-            'raster': dtm_raster,
-            'polygonLayer': photo_lay,
+            'dtmStore': open_dtm(ui.DTM.source()),
             'crsRasterLayer': ui.crs_rst,
             'tolerance': ui.doubleSpinBoxTolerance.value(),
+            'envelopeWidth': len_across if ui.checkBoxSwathEnvelope.isChecked() else None,
             'altitude_AGL': altitude_AGL,
-            'epsg_code': ui.epsg_code
+            'epsg_code': ui.epsg_code,
+            'tabWidg': ui.tabCorridor
         }
 
         if ui.tabCorridor:
             params['LineRangeList'] = line_buf_list
         else:
-            ui.geom_AoI = ui.AreaOfInterest.getFeatures().__next__().geometry()
-            params['Range'] = ui.geom_AoI
+            params['Range'] = ui.aoi_geom
 
         ui.startWorker_updateAltitude(mode='terrain', **params)                
     except Exception:
@@ -1,37 +1,64 @@
 import numpy as np
 from qgis.core import (
     QgsVectorLayer,
-    QgsFeature,
     QgsPointXY,
     QgsGeometry,
     QgsCoordinateReferenceSystem
 )
-from .....mathgeo_utils.coordinates import transf_coord, crs2pixel
+from .....mathgeo_utils.coordinates import transf_coord, transform_xy, transformer, crs2pixel
 from .....mathgeo_utils.algebra import rotation_matrix
-from .utils import clip_raster, image_edge_points, ground_edge_points
+from .utils import clip_raster, image_edge_points, ground_edge_points, photos_bounds
 from .styles import footprint_props
 from scipy import ndimage
-from .....geoprocessing_utils import change_layer_style
+from .....geoprocessing_utils import change_layer_style, LayerWriter
 from .....geometry_utils import overlap_photo, gsd
 from .....error_reporting import QgsPrint
+from .....planning.dtm import is_mosaic, mosaic_window, open_dtm
+
+
+def footprints_dtm(dtm_store, xyf, rotations, pc_x, pc_y, heights, height_is_ASL, transf_vct_rst):
+    """Return DTM store limited to tiles under photos if DTM is a tiles
+    mosaic. Window grows from tiles under projection centres until
+    the minimum height of its DTM places all photos inside it."""
+    if not is_mosaic(dtm_store.path):
+        return dtm_store
+
+    x, y = (pc_x, pc_y) if transf_vct_rst is None else transf_coord(transf_vct_rst, pc_x, pc_y)
+    bounds = (np.min(x), np.min(y), np.max(x), np.max(y))
+    window = None
+    while True:
+        path = mosaic_window(dtm_store.path, bounds)
+        if path == window:
+            return open_dtm(path)
+        window = path
+        h_min, h_max = open_dtm(window).minmax()
+        Zs = heights if height_is_ASL else heights + h_max
+        photos = photos_bounds(xyf, rotations, pc_x, pc_y, Zs, h_min, transf_vct_rst)
+        bounds = (min(bounds[0], photos[0]), min(bounds[1], photos[1]),
+                  max(bounds[2], photos[2]), max(bounds[3], photos[3]))
 
 
 def process_footprints(worker):
     """Quality Control: Process footprints layer"""
     transf_vct_rst = transf_rst_vct = None
     if worker.crs_rst != worker.crs_vct:
-        from pyproj import Transformer
-        transf_vct_rst = Transformer.from_crs(
-            worker.crs_vct, worker.crs_rst, always_xy=True)
-        transf_rst_vct = Transformer.from_crs(
-            worker.crs_rst, worker.crs_vct, always_xy=True)
+        transf_vct_rst = transformer(worker.crs_vct, worker.crs_rst)
+        transf_rst_vct = transformer(worker.crs_rst, worker.crs_vct)
 
-    Z_srtm = worker.raster.GetRasterBand(1).ReadAsArray()
-    nodata = worker.raster.GetRasterBand(1).GetNoDataValue()
-    rst_array = np.ma.masked_equal(Z_srtm, nodata)
-    Z_min = np.nanmin(rst_array)
+    layer = worker.layer
+    features = list(layer.getFeatures())
+    points = [feature.geometry().asPoint() for feature in features]
+    pc_x, pc_y = np.array([p.x() for p in points]), np.array([p.y() for p in points])
+    heights = np.array([feature.attribute(worker.height_f) for feature in features], dtype=float)
+    rotations = [rotation_matrix(feature.attribute(worker.omega_f), feature.attribute(worker.phi_f),
+                                 feature.attribute(worker.kappa_f)) for feature in features]
+    xyf_corners = worker.camera.image_corners()
 
-    uplx_r, xres_r, xskew_r, uply_r, yskew_r, yres_r = worker.raster.GetGeoTransform()
+    dtm_store = footprints_dtm(worker.dtm_store, xyf_corners, rotations, pc_x, pc_y,
+                               heights, worker.height_is_ASL, transf_vct_rst)
+    Z_min = dtm_store.minmax()[0]
+
+    uplx_r, xres_r, xskew_r, uply_r, yskew_r, yres_r = dtm_store.geotransf
 
     if QgsCoordinateReferenceSystem(worker.crs_rst).isGeographic():
         uplx_v, uply_v = transf_coord(transf_rst_vct, uplx_r, uply_r)
@@ -42,50 +69,38 @@ def process_footprints(worker):
 
     mean_res = (abs(xres_r) + abs(yres_r)) / 2
 
-    layer = worker.layer
     footprint_lay = QgsVectorLayer(
         "Polygon?crs=EPSG:2180", "footprints", "memory")
-    provider = footprint_lay.dataProvider()
+    footprint_writer = LayerWriter(footprint_lay)
 
-    features = layer.getFeatures()
-    xyf_corners = worker.camera.image_corners()
+    pc_x_rast, pc_y_rast = transform_xy(worker.crs_vct, worker.crs_rst, pc_x, pc_y)
+    if not worker.height_is_ASL:
+        terrain_heights = dtm_store.sample(pc_x_rast, pc_y_rast)
 
-    feat_footprint = QgsFeature()
     ds_list, ulx_list, uly_list, lrx_list, lry_list = [], [], [], [], []
 
     feat_count = layer.featureCount()
     progress_c = 0
     step = feat_count // 1000 if feat_count >= 1000 else 1
 
-    for feature in features:
+    for i in range(len(features)):
         if worker.killed:
             worker.handle_cancel()
             return None
 
-        Xs = feature.geometry().asPoint().x()
-        Ys = feature.geometry().asPoint().y()
-        Zs = feature.attribute(worker.height_f)
+        Xs = pc_x[i]
+        Ys = pc_y[i]
+        Zs = heights[i]
 
         if not worker.height_is_ASL:
-            x, y = Xs, Ys
-            if worker.crs_rst != worker.crs_vct:
-                x, y = transf_coord(transf_vct_rst, Xs, Ys)
-            terrain_height, _ = worker.DTM.dataProvider().sample(QgsPointXY(x, y), 1)
-            Zs += terrain_height
-
-        omega = feature.attribute(worker.omega_f)
-        phi = feature.attribute(worker.phi_f)
-        kappa = feature.attribute(worker.kappa_f)
-        R = rotation_matrix(omega, phi, kappa)
-
-        clipped_DTM, clipped_geot = clip_raster(worker.raster, xyf_corners, R, Xs, Ys, Zs, Z_min,
+            Zs += terrain_heights[i]
+
+        R = rotations[i]
+
+        clipped_DTM, clipped_geot = clip_raster(dtm_store, xyf_corners, R, Xs, Ys, Zs, Z_min,
                                                 transf_vct_rst, worker.crs_rst, worker.crs_vct)
 
-        if worker.crs_rst != worker.crs_vct:
-            Xs_rast, Ys_rast = transf_coord(transf_vct_rst, Xs, Ys)
-            c, r = crs2pixel(clipped_geot, Xs_rast, Ys_rast)
-        else:
-            c, r = crs2pixel(clipped_geot, Xs, Ys)
+        c, r = crs2pixel(clipped_geot, pc_x_rast[i], pc_y_rast[i])
 
         Z_under_pc = ndimage.map_coordinates(
             clipped_DTM, np.array([[r, c]]).T)[0]
@@ -97,9 +112,7 @@ def process_footprints(worker):
 
         geom_footprint = QgsGeometry.fromPolygonXY(
             [[QgsPointXY(x, y) for x, y in footprint_vertices]])
-        feat_footprint.setGeometry(geom_footprint)
-        provider.addFeatures([feat_footprint])
-        footprint_lay.updateExtents()
+        footprint_writer.add(geom_footprint, [])
 
         if worker.overlap_bool or worker.gsd_bool:
             if worker.crs_vct != worker.crs_rst:
@@ -145,7 +158,8 @@ def process_footprints(worker):
         if progress_c % step == 0:
             worker.progress.emit(int(progress_c / feat_count * 100))
 
-        if worker.footprint_bool:
-            change_layer_style(footprint_lay, footprint_props)
+    footprint_writer.flush()
+    if worker.footprint_bool:
+        change_layer_style(footprint_lay, footprint_props)
 
     return footprint_lay, ds_list, ulx_list, uly_list, lrx_list, lry_list, xres, yres
@@ -2,12 +2,9 @@ import numpy as np
 from .....mathgeo_utils.coordinates import crs2pixel, pixel2crs, transf_coord
 import scipy.ndimage as ndimage
 
-def clip_raster(ds, xyf, R, Xs, Ys, Zs, Z_min, trans_v_r, crs_rst, crs_vct):
-    """Return DTM clipped by bounding box of photo. Range of bounding box
-     is derived from photo's Exterior Orientation Parameters, camera parameters
-     and minimum height of DTM"""
-
-    DTM_array = ds.GetRasterBand(1).ReadAsArray()
+def photo_range(xyf, R, Xs, Ys, Zs, Z_min):
+    """Return ground coordinates of principal point and half size
+    of square covering photo at height Z_min"""
     focal = xyf[0, 2]
     img_corners = np.vstack(([0, 0, focal], xyf))
 
@@ -18,6 +15,27 @@ def clip_raster(ds, xyf, R, Xs, Ys, Zs, Z_min, trans_v_r, crs_rst, crs_vct):
 
     X_pc, Y_pc = X_min[0], Y_min[0]
     buffer = max(((X_pc - X_min[1:])**2 + (Y_pc - Y_min[1:])**2)**0.5)
+    return X_pc, Y_pc, buffer
+
+
+def photos_bounds(xyf, rotations, Xs, Ys, Zs, Z_min, trans_v_r):
+    """Return bounds (x_min, y_min, x_max, y_max) in DTM CRS of squares
+    covering all photos at height Z_min"""
+    ranges = np.array([photo_range(xyf, R, X, Y, Z, Z_min)
+                       for R, X, Y, Z in zip(rotations, Xs, Ys, Zs)])
+    X_pc, Y_pc, buffer = ranges.T
+    X = np.concatenate((X_pc - buffer, X_pc + buffer, X_pc - buffer, X_pc + buffer))
+    Y = np.concatenate((Y_pc - buffer, Y_pc - buffer, Y_pc + buffer, Y_pc + buffer))
+    if trans_v_r is not None:
+        X, Y = transf_coord(trans_v_r, X, Y)
+    return X.min(), Y.min(), X.max(), Y.max()
+
+
+def clip_raster(dtm, xyf, R, Xs, Ys, Zs, Z_min, trans_v_r, crs_rst, crs_vct):
+    """Return DTM clipped by bounding box of photo. Range of bounding box
+     is derived from photo's Exterior Orientation Parameters, camera parameters
+     and minimum height of DTM, read from DTM store"""
+    X_pc, Y_pc, buffer = photo_range(xyf, R, Xs, Ys, Zs, Z_min)
 
     max_range_X = X_pc + buffer
     min_range_X = X_pc - buffer
@@ -31,9 +49,9 @@ def clip_raster(ds, xyf, R, Xs, Ys, Zs, Z_min, trans_v_r, crs_rst, crs_vct):
 
     if crs_vct != crs_rst:
         X, Y = transf_coord(trans_v_r, range[:, 0], range[:, 1])
-        cols, rows = crs2pixel(ds.GetGeoTransform(), X, Y)
+        cols, rows = crs2pixel(dtm.geotransf, X, Y)
     else:
-        cols, rows = crs2pixel(ds.GetGeoTransform(), range[:, 0], range[:, 1])
+        cols, rows = crs2pixel(dtm.geotransf, range[:, 0], range[:, 1])
 
     upper_left_c, upper_left_r = int(min(cols)//1), int(min(rows)//1)
     bottom_right_c, bottom_right_r = int(max(cols)//1), int(max(rows)//1)
@@ -43,21 +61,33 @@ def clip_raster(ds, xyf, R, Xs, Ys, Zs, Z_min, trans_v_r, crs_rst, crs_vct):
     if upper_left_c < 0:
         upper_left_c = 0
 
-    if bottom_right_r > DTM_array.shape[0]:
-        bottom_right_r = DTM_array.shape[0]
-    if bottom_right_c > DTM_array.shape[1]:
-        bottom_right_c = DTM_array.shape[1]
+    bottom_right_r = min(bottom_right_r + 1, dtm.height)
+    bottom_right_c = min(bottom_right_c + 1, dtm.width)
 
-    x0, y0 = pixel2crs(ds.GetGeoTransform(), upper_left_c, upper_left_r)
-    clipped_DTM = np.array(DTM_array[upper_left_r: bottom_right_r+1,
-                           upper_left_c: bottom_right_c+1])
-    updated_geotransform = list(ds.GetGeoTransform())
+    x0, y0 = pixel2crs(dtm.geotransf, upper_left_c, upper_left_r)
+    clipped_DTM = fill_nodata(dtm.read(upper_left_c, upper_left_r,
+                                       bottom_right_c - upper_left_c,
+                                       bottom_right_r - upper_left_r), Z_min)
+    updated_geotransform = list(dtm.geotransf)
     updated_geotransform[0] = x0
     updated_geotransform[3] = y0
 
     return clipped_DTM, updated_geotransform
 
 
+def fill_nodata(heights, fallback):
+    """Return heights with NaN (nodata or outside the DTM) replaced by
+    the nearest valid height, or by fallback if there is none, so that
+    spline interpolation of the window stays finite."""
+    nodata = np.isnan(heights)
+    if not nodata.any():
+        return heights
+    if nodata.all():
+        return np.full(heights.shape, fallback, dtype=heights.dtype)
+    nearest = ndimage.distance_transform_edt(nodata, return_distances=False, return_indices=True)
+    return heights[tuple(nearest)]
+
+
 def ground_edge_points(R, Z, threshold, xyf, Xs, Ys, Zs,
                        Z_DTM, geotransform, crs_DTM, crs_pc, transformer):
     """Return ground coordinates of points representing edges of photo."""
@@ -13,7 +13,7 @@ class WorkerControl(QObject):
         self.layer = data.get('pointLayer')
         self.crs_vct = data.get('crsVectorLayer')
         self.DTM = data.get('DTM')
-        self.raster = data.get('raster')
+        self.dtm_store = data.get('dtmStore')
         self.crs_rst = data.get('crsRasterLayer')
 
         self.height_is_ASL = data.get('height_is_ASL')
@@ -1,10 +1,12 @@
-from qgis.core import QgsVectorLayer
-from qgis.analysis import QgsZonalStatistics
+from qgis.core import QgsCoordinateTransform, QgsGeometry, QgsProject, QgsRasterLayer, QgsWkbTypes
 from qgis import processing
-from math import ceil, fabs, isnan
-from pyproj import Transformer
-from ..mathgeo_utils.coordinates import transf_coord
+import numpy as np
+from math import ceil, fabs
+from ..mathgeo_utils.coordinates import transf_coord, transformer
 from ..error_reporting import QgsMessBox
+from ..geoprocessing_utils import geometry_parts, geometry_polygons
+from ..planning.cache import fingerprint, plan_cache
+from ..planning.dtm import is_mosaic, mosaic_window, open_dtm
 
 
 def create_buffer_around_line(path_line, gdal_ds, dtm_layer, buffer_value):
@@ -18,7 +20,7 @@ def create_buffer_around_line(path_line, gdal_ds, dtm_layer, buffer_value):
     crs_rst = dtm_layer.crs().authid()
     crs_vec = path_line.sourceCrs().authid()
     if crs_rst != crs_vec:
-        tf = Transformer.from_crs(crs_rst, crs_vec, always_xy=True)
+        tf = transformer(crs_rst, crs_vec)
         ulx, uly = transf_coord(tf, ulx, uly)
         ulx_n, uly_n = transf_coord(tf, ulx_n, uly_n)
 
@@ -37,127 +39,95 @@ def create_buffer_around_line(path_line, gdal_ds, dtm_layer, buffer_value):
     out = processing.run("native:buffer", params)["OUTPUT"]
     return out, min_buf
 
+def dtm_window(dtm_layer, crs, extent):
+    """Return DTM layer limited to tiles intersecting extent (QgsRectangle
+    in crs) if DTM is a tiles mosaic, otherwise the DTM layer itself"""
+    if not is_mosaic(dtm_layer.source()):
+        return dtm_layer
+    if crs != dtm_layer.crs():
+        extent = QgsCoordinateTransform(crs, dtm_layer.crs(), QgsProject.instance()).transformBoundingBox(extent)
+    window = mosaic_window(dtm_layer.source(), (extent.xMinimum(), extent.yMinimum(),
+                                                extent.xMaximum(), extent.yMaximum()))
+    return QgsRasterLayer(window, dtm_layer.name())
+
 def check_raster_values_on_polygon(raster_layer, polygon_geom):
-    """Verifies that the raster has valid values inside the AoI."""
-    extent = polygon_geom.boundingBox()
-    band = 1
-
-    provider = raster_layer.dataProvider()
-    block = provider.block(band, extent, int(extent.width()), int(extent.height()))
-
-    for row in range(block.height()):
-        for col in range(block.width()):
-            val = block.value(col, row)
-            if val is None or (isinstance(val, float) and isnan(val)):
-                raise ValueError("Raster contains None or NaN values within the polygon AoI.")
-            
+    """Return fraction of raster pixels inside the polygon (in raster CRS)
+    without valid values and coordinates of their centres."""
+    return open_dtm(raster_layer.source()).invalid_in_rings(geometry_parts(polygon_geom))
+
+def check_raster_values_on_line(raster_layer, line_geom):
+    """Return fraction of points along the line (in raster CRS), spaced by
+    the pixel size, without valid values and their coordinates."""
+    store = open_dtm(raster_layer.source())
+    spacing = min(abs(store.geotransf[1]), abs(store.geotransf[5]))
+    points = np.vstack(geometry_parts(line_geom.densifyByDistance(spacing)))
+    invalid = np.isnan(store.sample(points[:, 0], points[:, 1]))
+    return invalid.mean(), points[invalid]
+
+def dtm_footprint(dtm_layer):
+    """Return valid-data footprint of DTM and its prepared geometry engine,
+    cached by source path and modification time of the DTM"""
+    store = open_dtm(dtm_layer.source())
+
+    def prepare():
+        footprint = QgsGeometry()
+        footprint.fromWkb(store.footprint_wkb())
+        engine = QgsGeometry.createGeometryEngine(footprint.constGet())
+        engine.prepareGeometry()
+        return footprint, engine
+
+    return plan_cache.get_or_compute(fingerprint('dtm_footprint', store.source), prepare)
+
 def is_poligon_inside_raster(vlayer, dtm_layer):
-    """Verifies whether all features in a vector layer are fully inside the extent of a raster"""
-    params_calc = {
-        'INPUT_A': dtm_layer,
-        'BAND_A': 1,
-        'FORMULA': '1',
-        'OUTPUT': 'TEMPORARY_OUTPUT',
-        'RTYPE': 0,
-        'NO_DATA': None,
-        'EXTENT': 'ignore'
-    }
-    raster_ones = processing.run("gdal:rastercalculator", params_calc)['OUTPUT']
-    
-    params_polygonize = {
-        'INPUT': raster_ones,
-        'BAND': 1,
-        'FIELD': 'DN',
-        'OUTPUT': 'TEMPORARY_OUTPUT'
-    }
-    raster_polygon = processing.run("gdal:polygonize", params_polygonize)['OUTPUT']
-    
-    raster_polygon_layer = QgsVectorLayer(raster_polygon, "raster_polygon", "ogr")
-    
-    raster_geom = None
-    for feat in raster_polygon_layer.getFeatures():
-        geom = feat.geometry()
-        raster_geom = geom if raster_geom is None else raster_geom.combine(geom)
+    """Verifies whether all features in a vector layer are fully inside the extent of a raster.
+    Features not contained in the coarse DTM footprint are checked pixel by pixel"""
+    _, engine = dtm_footprint(dtm_layer)
+    transform = None
+    if vlayer.crs() != dtm_layer.crs():
+        transform = QgsCoordinateTransform(vlayer.crs(), dtm_layer.crs(), QgsProject.instance())
 
     features_outside = []
     for f in vlayer.getFeatures():
-        if not raster_geom.contains(f.geometry()):
-            features_outside.append(f.id())
+        geom = f.geometry()
+        if transform is not None:
+            geom.transform(transform)
+        if engine.contains(geom.constGet()):
+            continue
+        if geom.type() == QgsWkbTypes.PolygonGeometry:
+            fraction, coords = check_raster_values_on_polygon(dtm_layer, geom)
+        else:
+            fraction, coords = check_raster_values_on_line(dtm_layer, geom)
+        if fraction > 0:
+            x_min, y_min = coords.min(axis=0)
+            x_max, y_max = coords.max(axis=0)
+            features_outside.append(f"Feature {f.id()}: {fraction:.1%} without DTM data,\n"
+                                    f"within X {x_min:.1f} - {x_max:.1f}, Y {y_min:.1f} - {y_max:.1f}")
     
     if features_outside:
-        message = "AoI does not lie entirely\nwithin the extent of the DTM data."
+        message = "AoI does not lie entirely\nwithin the extent of the DTM data.\n\n" + \
+            "\n".join(features_outside) + f"\n(coordinates in {dtm_layer.crs().authid()})"
         QgsMessBox(title="AoI not in DTM", text=message, level="Critical")
         raise ValueError(message)
 
     return list(vlayer.getFeatures())
 
-def z_at_3d_line(pnt, start_pnt, end_pnt):
-    """Return "z" coordinate for point with known x,y
-    lying on line in space defined by start and end points.
-    """
-    x1, y1, z1 = start_pnt
-    x2, y2, z2 = end_pnt
-    x, y = pnt[:2]
-
-    if x1 != x2:
-        t = (x - x1) / (x2 - x1)
-    else:
-        t = (y - y1) / (y2 - y1)
-    z = t * (z2 - z1) + z1
-    return z
-
-
-def simplify_profile(vertices, epsilon):
-    """Reduces the number of vertices in the line, keeping its main shape.
-    It is based on the Douglas-Peucker simplification algorithm but
-    with the vertical distance instead of perpendicular.
-    """
-    hmax = 0.0
-    index = 0
-    for i in range(1, len(vertices) - 1):
-        z = z_at_3d_line(vertices[i], vertices[0], vertices[-1])
-        h = abs(z - vertices[i][2])
-        if h > hmax:
-            index = i
-            hmax = h
-
-    if hmax >= epsilon:
-        results = simplify_profile(vertices[:index+1], epsilon)[:-1]\
-                  + simplify_profile(vertices[index:], epsilon)
-    else:
-        results = [vertices[0], vertices[-1]]
-
-    return results
-
 def clipped_raster_minmax(vlayer, dtm_layer):
     """Calculates minimum and maximum elevation values from DTM"""
+    dtm_layer = dtm_window(dtm_layer, vlayer.crs(), vlayer.extent())
     features_inside = is_poligon_inside_raster(vlayer, dtm_layer)
-    temp_layer = QgsVectorLayer(f"Polygon?crs={vlayer.crs().authid()}", "temp", "memory")
-    temp_layer.dataProvider().addFeatures(features_inside)
-    
-    stats = QgsZonalStatistics(
-        temp_layer, 
-        dtm_layer,
-        "pre_",
-        1,
-        QgsZonalStatistics.Min | QgsZonalStatistics.Max
-    )
-    
-    if stats.calculateStatistics(None) != 0:
-        raise RuntimeError("Error in calculating stats.")
-
-    gmin, gmax = None, None
-    for f in temp_layer.getFeatures():
-        try:
-            mn, mx = float(f["pre_min"]), float(f["pre_max"])
-            gmin = mn if gmin is None or mn < gmin else gmin
-            gmax = mx if gmax is None or mx > gmax else gmax
-        except:
-            continue
-    
-    if gmin is None or gmax is None:
+    transf_vct_rst = None
+    if vlayer.crs() != dtm_layer.crs():
+        transf_vct_rst = transformer(vlayer.crs(), dtm_layer.crs())
+
+    # polygon by polygon, so that overlapping features do not cancel out
+    store = open_dtm(dtm_layer.source())
+    minmax = []
+    for f in features_inside:
+        for rings in geometry_polygons(f.geometry()):
+            try:
+                minmax.append(store.minmax_in_rings(rings, transf_vct_rst))
+            except ValueError:
+                continue
+    if not minmax:
         raise ValueError("Could not determine min/max values from raster.")
-    
-    return gmin, gmax
-
-
+    return min(h_min for h_min, _ in minmax), max(h_max for _, h_max in minmax)